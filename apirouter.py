@@ -0,0 +1,202 @@
+"""
+
+Bismuth Explorer API Router Module
+
+Version 2.0.2
+
+The /api/<param1>/<param2> endpoints as a table. Groups with commands (node,
+info) take param2 as command:arg1:arg2 and match the command exactly. Other
+groups take param2 whole as their single argument.
+
+JSON endpoints are also served as MessagePack or CBOR, chosen by a format
+argument or the Accept header. Encoded bodies of final data, and of tip
+data until the next block, are kept in a cache.
+
+"""
+
+import json
+import time
+import logging
+from threading import Lock
+
+from flask import request
+
+import httpcache
+import encoding
+
+
+class ApiError(Exception):
+    """An error answered to the client as {"error": message}."""
+
+    def __init__(self, message, status=400):
+        Exception.__init__(self, message)
+        self.message = message
+        self.status = status
+
+
+class Endpoint:
+    """One API command with its parsing, caching and serialization.
+
+    policy is a key of httpcache.API_POLICIES, or 'block' for data of one
+    block, which becomes 'final' or 'recent' by its depth. height is None,
+    'tip' for the current chain height, or a function of (args, data)
+    giving the block the data belongs to. rate is the rate class used for
+    admission control. node marks endpoints that call the node, so their
+    failures are reported as the node being unavailable. An endpoint with
+    its own serializer is served as is, without format negotiation.
+    """
+
+    def __init__(self, name, func, args=0, policy='tip', height='tip', rate='light', node=False,
+                 mimetype='application/json', serializer=None):
+        self.name = name
+        self.func = func
+        self.args = args
+        self.policy = policy
+        self.height = height
+        self.rate = rate
+        self.node = node
+        self.mimetype = mimetype
+        self.serializer = serializer
+
+        self.calls = self.errors = self.cached = 0
+        self.total_time = self.max_time = 0.0
+        self.lock = Lock()
+
+    def record(self, elapsed, failed, cached=False):
+        with self.lock:
+            self.calls += 1
+            self.errors += failed
+            self.cached += cached
+            self.total_time += elapsed
+            self.max_time = max(self.max_time, elapsed)
+
+    def stats(self):
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'cached': self.cached,
+            'avg_ms': round(self.total_time * 1000 / self.calls, 3) if self.calls else 0.0,
+            'max_ms': round(self.max_time * 1000, 3),
+            'rate': self.rate,
+            'node': self.node,
+        }
+
+
+NODE_FAILED = {"error": "request failed", "data": "unable to connect to node - try again later"}
+
+
+class Router:
+
+    def __init__(self, tip, confirmations, logger=None, limiter=None, cache=None):
+        self.tip = tip
+        self.confirmations = confirmations
+        self.limiter = limiter
+        self.cache = cache  # httpcache.LRUCache of encoded bodies, or None
+        self.log = logger or logging.getLogger(__name__)
+        self.groups = {}
+
+    def endpoint(self, group, *commands, **options):
+        """Register the decorated function for group and each command.
+
+        Without commands the function gets param2 whole.
+        """
+        def decorator(func):
+            names = commands or (None,)
+            ep = Endpoint("{}/{}".format(group, names[0]) if names[0] else group, func, **options)
+            for command in names:
+                self.groups.setdefault(group, {})[command] = ep
+            return func
+        return decorator
+
+    def resolve(self, param1, param2):
+        """Endpoint and argument list for a request, or ApiError."""
+        table = self.groups.get(param1)
+        if table is None:
+            raise ApiError("invalid request")
+        if None in table:
+            return table[None], [param2]
+
+        command, sep, rest = param2.partition(":")
+        ep = table.get(command)
+        if ep is None:
+            raise ApiError("invalid request")
+        args = rest.split(":", ep.args - 1) if sep and ep.args else []
+        if len(args) != ep.args:
+            raise ApiError("invalid request, {} takes {} argument{}".format(
+                command, ep.args, "" if ep.args == 1 else "s"))
+        return ep, args
+
+    def dispatch(self, param1, param2):
+        start = time.time()
+        try:
+            ep, args = self.resolve(param1, param2)
+        except ApiError as e:
+            return self._error(None, start, {"error": e.message}, e.status)
+
+        fmt = None
+        if ep.serializer is None:
+            try:
+                fmt = encoding.negotiate(request.args.get('format'), request.headers.get('Accept'))
+            except ValueError as e:
+                return self._error(ep, start, {"error": str(e)}, 406)
+
+        # Cached bodies cost no database or node work, so they skip admission control
+        key = (ep.name, tuple(args), fmt)
+        if self.cache is not None and fmt is not None and ep.policy not in ('volatile', 'none'):
+            entry = self.cache.get(key)
+            if entry is not None:
+                body, policy, height, tip = entry
+                if policy == 'final' or tip == self.tip():
+                    ep.record(time.time() - start, False, cached=True)
+                    return httpcache.api_response(body, policy, height=height, mimetype=encoding.MIMETYPES[fmt],
+                                                  variant=fmt)
+
+        if self.limiter is not None:
+            wait = self.limiter.acquire(ep.rate)
+            if wait:
+                ep.record(time.time() - start, True)
+                return self.limiter.too_many(wait)
+        try:
+            data = ep.func(*args)
+            body = ep.serializer(data) if fmt is None else encoding.dumps(data, fmt)
+        except ApiError as e:
+            return self._error(ep, start, {"error": e.message}, e.status)
+        except Exception as e:
+            if ep.node:
+                return self._error(ep, start, NODE_FAILED, 400)
+            self.log.error("API {} failed: {}".format(ep.name, e))
+            return self._error(ep, start, {"error": "request failed"}, 500)
+        finally:
+            if self.limiter is not None:
+                self.limiter.release(ep.rate)
+
+        policy, height = ep.policy, ep.height
+        if height == 'tip':
+            height = self.tip()
+        elif callable(height):
+            height = height(args, data)
+        if policy == 'block':
+            policy = httpcache.block_policy(height, self.tip(), self.confirmations)
+
+        ep.record(time.time() - start, False)
+        if fmt is None:
+            return httpcache.api_response(body, policy, height=height, mimetype=ep.mimetype)
+
+        if self.cache is not None and policy in ('final', 'tip'):
+            self.cache.put(key, (body, policy, height, self.tip()), len(body))
+        return httpcache.api_response(body, policy, height=height, mimetype=encoding.MIMETYPES[fmt], variant=fmt)
+
+    def _error(self, ep, start, error, status):
+        if ep is not None:
+            ep.record(time.time() - start, True)
+        return httpcache.api_response(json.dumps(error), 'none', status=status)
+
+    def cache_stats(self):
+        return self.cache.stats() if self.cache is not None else {}
+
+    def stats(self):
+        seen = {}
+        for table in self.groups.values():
+            for ep in table.values():
+                seen[ep.name] = ep.stats()
+        return seen
@@ -0,0 +1,151 @@
+"""
+
+Bismuth Explorer Batch API Module
+
+Version 2.0.2
+
+Runs many lookups from one request. Identical queries run once, the work is
+spread over a few workers and each worker keeps its node connection and its
+database connections for all the queries it handles.
+
+"""
+
+import sqlite3
+
+import gevent
+import toolsp
+
+KINDS = ('balance', 'txid', 'alias', 'miner', 'block')
+
+
+class BatchError(Exception):
+    """The batch request itself is invalid."""
+
+
+def tx_dict(b, full=False):
+    # Same fields as /api/block and /api/txid
+    d = {"block": str(b[0]), "timestamp": str(b[1]), "from": str(b[2]), "to": str(b[3]), "amount": str(b[4])}
+    if full:
+        d.update({"signature": str(b[5]), "txid": str(b[5][:56]), "pubkey": str(b[6]), "hash": str(b[7])})
+    else:
+        d["txid"] = str(b[5][:56])
+    d.update({"fee": str(b[8]), "reward": str(b[9]), "operation": str(b[10]), "openfield": str(b[11])})
+    return d
+
+
+class Session:
+    """Connections of one worker, opened on first use."""
+
+    def __init__(self, bis_root, custom_aliases):
+        self.bis_root = bis_root
+        self.custom_aliases = custom_aliases
+        self.node = toolsp.NodeSession()
+        self._dbs = {}
+
+    def db(self, path):
+        """Read-only connection to path, so a missing database is never created.
+
+        Raises LookupError when path cannot be opened.
+        """
+        conn = self._dbs.get(path)
+        if conn is None:
+            try:
+                conn = sqlite3.connect('file:{}?mode=ro'.format(path), uri=True)
+            except sqlite3.Error:
+                raise LookupError("{} is not available yet".format(path))
+            conn.text_factory = str
+            self._dbs[path] = conn
+        return conn
+
+    def close(self):
+        self.node.close()
+        for conn in self._dbs.values():
+            conn.close()
+
+    def balance(self, address):
+        return self.node.call("balancegetjson", address)
+
+    def alias(self, address):
+        if address in self.custom_aliases:
+            alias = self.custom_aliases[address]
+        else:
+            alias = self.node.call("aliasget", address)[0][0]
+        return {"address": address, "alias": alias}
+
+    def txid(self, txid):
+        txid = txid.replace(".", "/")
+        # Same signature range lookup as classify.Classifier.transaction
+        m_detail = self.db(self.bis_root).execute(
+            "SELECT * FROM transactions WHERE signature >= ? AND signature < ? LIMIT 1;",
+            (txid, txid + '\x7f')).fetchone()
+        if not m_detail:
+            raise LookupError("txid does not appear to exist or invalid data")
+        return tx_dict(m_detail, full=True)
+
+    def miner(self, address):
+        try:
+            m_info = self.db('tools.db').execute("SELECT * FROM minerlist WHERE address = ?;", (address,)).fetchone()
+        except sqlite3.Error:
+            raise LookupError("miner list is not available yet")
+        if not m_info:
+            raise LookupError("{} is not a miner....".format(address))
+        return {'address': str(m_info[0]), 'alias': str(m_info[5]), 'latestblock': str(m_info[1]),
+                'firstblock': str(m_info[2]), 'totalblocks': str(m_info[3]), 'rewards': str(m_info[4])}
+
+    def block(self, height):
+        if not str(height).isdigit():
+            raise ValueError("invalid block height")
+        rows = self.db(self.bis_root).execute(
+            "SELECT * FROM transactions WHERE block_height = ?;", (int(height),)).fetchall()
+        if not rows:
+            raise LookupError("block does not exist or invalid block")
+        return [tx_dict(b) for b in rows]
+
+
+def parse(body, batch_max):
+    """List of (type, arg) from a request body, or BatchError."""
+    queries = body.get("queries") if isinstance(body, dict) else body
+    if not isinstance(queries, list) or not queries:
+        raise BatchError("expected a list of queries")
+    if len(queries) > batch_max:
+        raise BatchError("at most {} queries per batch".format(batch_max))
+
+    parsed = []
+    for q in queries:
+        if not isinstance(q, dict) or not isinstance(q.get("arg"), (str, int)):
+            parsed.append((None, q))
+        else:
+            parsed.append((q.get("type"), str(q["arg"]).strip()))
+    return parsed
+
+
+def run(queries, bis_root, workers=8, custom_aliases=None):
+    """Results in query order. Each one holds a result or its own error."""
+    unique = list(dict.fromkeys(q for q in queries if q[0] in KINDS))
+    done = {}
+
+    def work(items):
+        session = Session(bis_root, custom_aliases or {})
+        try:
+            for kind, arg in items:
+                try:
+                    done[(kind, arg)] = {"result": getattr(session, kind)(arg)}
+                except (LookupError, ValueError) as e:
+                    done[(kind, arg)] = {"error": str(e)}
+                except Exception:
+                    done[(kind, arg)] = {"error": "request failed"}
+        finally:
+            session.close()
+
+    if unique:
+        n = max(1, min(workers, len(unique)))
+        gevent.joinall([gevent.spawn(work, unique[i::n]) for i in range(n)])
+
+    results = []
+    for kind, arg in queries:
+        if kind not in KINDS:
+            results.append({"type": kind, "arg": arg,
+                            "error": "invalid query, type must be one of {}".format(", ".join(KINDS))})
+        else:
+            results.append(dict({"type": kind, "arg": arg}, **done[(kind, arg)]))
+    return results
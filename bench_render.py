@@ -0,0 +1,112 @@
+"""
+
+Bismuth Explorer transaction table benchmark
+
+Compares renderers.render_transaction_table with the previous per-row
+BeautifulSoup implementation on synthetic ledger rows.
+
+The previous implementation needs BeautifulSoup4, which the explorer no
+longer uses. Install it with: pip install -r requirements-bench.txt
+
+Usage: python bench_render.py [rows] [repeats]
+
+"""
+
+import sys
+import time
+import random
+import string
+
+import renderers
+
+try:
+    from bs4 import BeautifulSoup
+except ImportError:
+    BeautifulSoup = None
+
+
+def legacy_render_transaction_table(all_rows, display_limit):
+    # Previous explorebis implementation, kept verbatim for comparison
+    rows_html = ""
+    for x in all_rows:
+        x_open = "HTML NOT SHOWN HERE" if BeautifulSoup(str(x[11]), "html.parser").find() else x[11][:20]
+        txid_short = f"{x[5][:5]}....{x[5][-5:]}"
+        from_d = f"{x[2][:5]}....{x[2][-5:]}"
+        to_d = f"{x[3][:5]}....{x[3][-5:]}"
+        det_str = x[5][:56].replace("+", "%2B").replace("<", "&lt;").replace(">", "&gt;")
+        det_link = f"/details?mydetail={det_str}&myaddress={x[2]}"
+        rows_html += f"""
+        <tr>
+            <td><a href='search?quicksearch={x[0]}'>{x[0]}</a></td>
+            <td>{time.strftime("%Y/%m/%d,%H:%M:%S", time.gmtime(float(x[1])))}</td>
+            <td><a href='search?quicksearch={x[2]}'>{from_d}</a></td>
+            <td><a href='search?quicksearch={x[3]}'>{to_d}</a></td>
+            <td>{x[4]}</td>
+            <td><a href="{det_link}">{x[5][:56]}</a></td>
+            <td>{x[8]}</td>
+            <td>{x[9]}</td>
+            <td>{x[10]}</td>
+            <td>{x_open}</td>
+        </tr>
+        """
+    header = """
+    <table class="table table-striped table-sm address-tx-list" style="font-size: 75%">
+      <thead><tr>
+        <th scope="col">Block</th><th scope="col">Timestamp</th><th scope="col">From</th>
+        <th scope="col">To</th><th scope="col">Amount</th><th scope="col">Transaction ID (txid)</th>
+        <th scope="col">Fee</th><th scope="col">Reward</th><th scope="col">Operation</th>
+        <th scope="col">Message Starts</th>
+      </tr></thead>
+    """
+    heading = "<center><h4>Transaction List</h4></center>" if display_limit == 0 else f"<center><h4>Transaction List</h4><small>({display_limit} tx limit)</small></center>"
+    return f"{heading}{header}{rows_html}</table>"
+
+
+def make_rows(count, seed=1):
+    rnd = random.Random(seed)
+    b64 = string.ascii_letters + string.digits + "+/"
+    openfields = ["", "hello", "odp:some message text here", "<b>bold</b> claim", "x" * 200]
+    rows = []
+    for i in range(count):
+        rows.append((
+            2000000 - i,
+            1600000000 + i * 60,
+            "".join(rnd.choice("0123456789abcdef") for _ in range(56)),
+            "".join(rnd.choice("0123456789abcdef") for _ in range(56)),
+            "{:.8f}".format(rnd.random() * 100),
+            "".join(rnd.choice(b64) for _ in range(684)),
+            "pubkey",
+            "blockhash",
+            "0.01000000",
+            "0",
+            "",
+            openfields[i % len(openfields)],
+        ))
+    return rows
+
+
+def best_of(func, rows, repeats):
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func(rows, 0)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    rows = make_rows(count)
+
+    new = best_of(renderers.render_transaction_table, rows, repeats)
+    print("rows: {}  best of {}".format(count, repeats))
+    print("join builder:     {:8.1f} ms  ({:.2f} us/row)".format(new * 1000, new * 1e6 / count))
+
+    if BeautifulSoup is None:
+        print("BeautifulSoup not installed, previous implementation skipped (pip install -r requirements-bench.txt)")
+    else:
+        old = best_of(legacy_render_transaction_table, rows, repeats)
+        print("BeautifulSoup +=: {:8.1f} ms  ({:.2f} us/row)".format(old * 1000, old * 1e6 / count))
+        print("speedup:          {:8.1f}x".format(old / new))
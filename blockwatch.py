@@ -0,0 +1,75 @@
+"""
+
+Bismuth Explorer Block Watch Module
+
+Version 2.0.2
+
+Notices new blocks by watching the node's ledger.db. PRAGMA data_version on
+a connection that stays open changes whenever another connection commits to
+the database, so most polls cost one pragma and the block height is only
+read after the node has written something.
+
+"""
+
+import time
+import sqlite3
+
+
+class BlockWatcher:
+
+    def __init__(self, db_path, interval=0.5):
+        self.db_path = db_path
+        self.interval = interval
+        self.conn = None
+        self.version = None
+        self.height = None
+        self._connect()
+
+    @property
+    def ok(self):
+        """False while ledger.db cannot be read, callers then poll the node."""
+        return self.conn is not None
+
+    def _connect(self):
+        try:
+            self.conn = sqlite3.connect('file:{}?mode=ro'.format(self.db_path), uri=True, timeout=1)
+            self.version = None
+        except sqlite3.Error:
+            self.conn = None
+
+    def poll(self):
+        """Current block height if it changed since the last poll, else None."""
+        if self.conn is None:
+            self._connect()
+            if self.conn is None:
+                return None
+        try:
+            version = self.conn.execute("PRAGMA data_version;").fetchone()[0]
+            if version == self.version:
+                return None
+            self.version = version
+            height = self.conn.execute("SELECT max(block_height) FROM transactions;").fetchone()[0]
+        except sqlite3.Error:
+            self.conn.close()
+            self.conn = None
+            return None
+
+        if height is None or height == self.height:
+            return None
+        self.height = height
+        return height
+
+    def wait(self, timeout):
+        """Poll until a new block is seen or timeout seconds have passed.
+
+        Returns the new height, or None on timeout.
+        """
+        deadline = time.time() + timeout
+        while True:
+            height = self.poll()
+            if height is not None:
+                return height
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return None
+            time.sleep(min(self.interval, remaining))
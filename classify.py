@@ -0,0 +1,112 @@
+"""
+
+Bismuth Explorer Classify Module
+
+Version 2.0.2
+
+Tells addresses, block heights, block hashes and txids apart without asking
+the node. Address formats are checked in-process: legacy addresses are 56
+lowercase hex characters, Bis1 addresses are base58check. A 56 hex string
+can also be a block hash, so the ledger's indexes on recipient, address,
+block_hash and signature decide which one it is.
+
+"""
+
+import re
+import hashlib
+import sqlite3
+
+B58 = '123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz'
+B58_PREFIXES = ('Bis1', 'tBis')
+
+HEX56 = re.compile(r'^[0-9a-f]{56}$')
+TXID = re.compile(r'^[A-Za-z0-9+/=]{56}$')
+
+
+def b58decode_check(text):
+    """Payload of a base58check string, or None if it does not decode or
+    its checksum is wrong."""
+    n = 0
+    for ch in text:
+        i = B58.find(ch)
+        if i < 0:
+            return None
+        n = n * 58 + i
+    raw = n.to_bytes((n.bit_length() + 7) // 8, 'big')
+    raw = b'\0' * (len(text) - len(text.lstrip('1'))) + raw
+    if len(raw) < 5:
+        return None
+    payload, check = raw[:-4], raw[-4:]
+    if hashlib.sha256(hashlib.sha256(payload).digest()).digest()[:4] != check:
+        return None
+    return payload
+
+
+def address_format(text):
+    """'rsa' for a legacy address, 'bis1' for a base58check one, else None."""
+    if not isinstance(text, str):
+        return None
+    if HEX56.match(text):
+        return 'rsa'
+    if text.startswith(B58_PREFIXES) and 30 <= len(text) <= 60 and b58decode_check(text):
+        return 'bis1'
+    return None
+
+
+def is_address(text):
+    return address_format(text) is not None
+
+
+class Classifier:
+    """Search input classified against ledger.db.
+
+    classify() returns 'block', 'address', 'hash', 'txid' or None. Every
+    lookup it makes is a single probe of one of the ledger indexes.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+
+    def _conn(self):
+        return sqlite3.connect('file:{}?mode=ro'.format(self.db_path), uri=True)
+
+    def _exists(self, conn, query, params):
+        return conn.execute(query, params).fetchone() is not None
+
+    def classify(self, text):
+        text = (text or "").strip()
+        if text.isdigit():
+            return 'block'
+        kind = address_format(text)
+        if kind == 'bis1':
+            return 'address'
+        if kind is None and not TXID.match(text):
+            return None
+
+        try:
+            with self._conn() as conn:
+                if kind == 'rsa':
+                    if (self._exists(conn, "SELECT 1 FROM transactions WHERE recipient = ? LIMIT 1;", (text,))
+                            or self._exists(conn, "SELECT 1 FROM transactions WHERE address = ? LIMIT 1;", (text,))):
+                        return 'address'
+                    if self._exists(conn, "SELECT 1 FROM transactions WHERE block_hash = ? LIMIT 1;", (text,)):
+                        return 'hash'
+                    # A valid address that has not been used yet
+                    return 'address'
+        except sqlite3.Error:
+            return 'address' if kind else 'txid'
+        return 'txid'
+
+    def transaction(self, txid):
+        """Ledger row of the transaction whose signature starts with txid, or None.
+
+        The range condition lets SQLite use the signature index, where LIKE
+        would scan the table.
+        """
+        try:
+            with self._conn() as conn:
+                return conn.execute(
+                    "SELECT * FROM transactions WHERE signature >= ? AND signature < ? LIMIT 1;",
+                    (txid, txid + '\x7f')).fetchone()
+        except sqlite3.Error:
+            return None
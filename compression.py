@@ -0,0 +1,218 @@
+"""
+
+Bismuth Explorer Compression Module
+
+Version 2.0.2
+
+Brotli is used when the optional brotli package is installed, gzip otherwise.
+
+"""
+
+import os
+import gzip
+import zlib
+import hashlib
+import mimetypes
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE = ('text/', 'application/json', 'application/javascript', 'application/x-ndjson',
+                'application/msgpack', 'application/cbor',
+                'image/svg+xml', 'image/x-icon', 'image/vnd.microsoft.icon')
+
+# Far future caching for fingerprinted assets
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+
+def accepted_encodings(accept_encoding):
+    """Encodings offered in an Accept-Encoding header, q=0 ones excluded."""
+    offered = set()
+    for part in (accept_encoding or '').lower().split(','):
+        name, _, params = part.strip().partition(';')
+        if params.strip().replace(' ', '') in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            continue
+        if name:
+            offered.add(name)
+    return offered
+
+
+def negotiate(accept_encoding):
+    """Best encoding we support for an Accept-Encoding header, or None."""
+    offered = accepted_encodings(accept_encoding)
+    if brotli is not None and 'br' in offered:
+        return 'br'
+    if 'gzip' in offered:
+        return 'gzip'
+    return None
+
+
+def compressible(content_type):
+    return (content_type or '').startswith(COMPRESSIBLE)
+
+
+class _Stream:
+    """Incremental gzip or brotli compressor flushed after every chunk."""
+
+    def __init__(self, encoding, level):
+        self.encoding = encoding
+        if encoding == 'br':
+            self._c = brotli.Compressor(quality=min(level, 11))
+        else:
+            self._c = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def chunk(self, data):
+        if self.encoding == 'br':
+            return self._c.process(data) + self._c.flush()
+        return self._c.compress(data) + self._c.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        if self.encoding == 'br':
+            return self._c.finish()
+        return self._c.flush()
+
+
+def compress(data, encoding, level):
+    if encoding == 'br':
+        return brotli.compress(data, quality=min(level, 11))
+    return gzip.compress(data, compresslevel=level)
+
+
+class CompressMiddleware:
+    """WSGI middleware compressing dynamic responses.
+
+    Responses with a Content-Length are compressed in one piece when they
+    are at least min_size bytes. Streamed responses without a length are
+    compressed chunk by chunk and flushed after each chunk, so the client
+    still receives data as it is produced.
+    """
+
+    def __init__(self, app, min_size=1024, level=6, skip_prefixes=('/socket.io',)):
+        self.app = app
+        self.min_size = min_size
+        self.level = level
+        self.skip_prefixes = skip_prefixes
+
+    def __call__(self, environ, start_response):
+        encoding = negotiate(environ.get('HTTP_ACCEPT_ENCODING'))
+        if encoding is None or environ.get('REQUEST_METHOD') == 'HEAD' \
+                or environ.get('PATH_INFO', '').startswith(self.skip_prefixes):
+            return self.app(environ, start_response)
+
+        captured = []
+
+        def capture(status, headers, exc_info=None):
+            # Headers are only sent once we know whether to compress
+            captured[:] = [status, headers, exc_info]
+            if exc_info:
+                return start_response(status, headers, exc_info)
+            return lambda data: None
+
+        body = self.app(environ, capture)
+        status, headers, exc_info = captured
+        if exc_info:
+            return body
+
+        h = {k.lower(): v for k, v in headers}
+        length = h.get('content-length')
+        if (not status.startswith('200') or 'content-encoding' in h
+                or not compressible(h.get('content-type'))
+                or (length is not None and int(length) < self.min_size)):
+            start_response(status, headers)
+            return body
+
+        # A strong ETag names exact bytes, the compressed body only matches weakly
+        headers = [(k, 'W/' + v if k.lower() == 'etag' and not v.startswith('W/') else v)
+                   for k, v in headers if k.lower() != 'content-length']
+        headers.append(('Content-Encoding', encoding))
+        vary = h.get('vary')
+        if vary is None:
+            headers.append(('Vary', 'Accept-Encoding'))
+        elif 'accept-encoding' not in vary.lower():
+            headers = [(k, v + ', Accept-Encoding' if k.lower() == 'vary' else v) for k, v in headers]
+
+        if length is not None:
+            try:
+                data = compress(b''.join(body), encoding, self.level)
+            finally:
+                if hasattr(body, 'close'):
+                    body.close()
+            headers.append(('Content-Length', str(len(data))))
+            start_response(status, headers)
+            return [data]
+
+        start_response(status, headers)
+        return self._stream(body, encoding)
+
+    def _stream(self, body, encoding):
+        stream = _Stream(encoding, self.level)
+        try:
+            for data in body:
+                if data:
+                    yield stream.chunk(data)
+            yield stream.finish()
+        finally:
+            if hasattr(body, 'close'):
+                body.close()
+
+
+class StaticAssets:
+    """Static files read once at startup, fingerprinted and precompressed.
+
+    Each file is served from /assets/<name>.<hash><ext>. The hash changes
+    with the content, so responses can be cached for a year.
+    """
+
+    def __init__(self, folder, level=9):
+        self.folder = folder
+        self.by_name = {}
+        self.by_url = {}
+        for root, _, files in os.walk(folder):
+            for filename in files:
+                path = os.path.join(root, filename)
+                name = os.path.relpath(path, folder).replace(os.sep, '/')
+                if name.startswith('qr') or name.startswith('.'):
+                    continue
+                self._add(name, path, level)
+
+    def _add(self, name, path, level):
+        with open(path, 'rb') as f:
+            raw = f.read()
+        digest = hashlib.sha1(raw).hexdigest()
+        stem, ext = os.path.splitext(name)
+        url_name = '{}.{}{}'.format(stem, digest[:10], ext)
+        mimetype = guess_type(name)
+        variants = {None: raw}
+        if compressible(mimetype):
+            variants['gzip'] = compress(raw, 'gzip', level)
+            if brotli is not None:
+                variants['br'] = compress(raw, 'br', 11)
+            variants = {k: v for k, v in variants.items() if k is None or len(v) < len(raw)}
+        asset = {'variants': variants, 'etag': digest, 'mimetype': mimetype}
+        self.by_name[name] = '/assets/' + url_name
+        self.by_url[url_name] = asset
+
+    def url(self, name):
+        """Fingerprinted URL for a file in the static folder."""
+        return self.by_name.get(name, '/static/' + name)
+
+    def lookup(self, url_name, accept_encoding):
+        """Body, encoding, etag and mimetype for a fingerprinted asset, or None."""
+        asset = self.by_url.get(url_name)
+        if asset is None:
+            return None
+        variants = asset['variants']
+        offered = accepted_encodings(accept_encoding)
+        for encoding in ('br', 'gzip'):
+            if encoding in variants and encoding in offered:
+                return variants[encoding], encoding, asset['etag'], asset['mimetype']
+        return variants[None], None, asset['etag'], asset['mimetype']
+
+
+def guess_type(name):
+    mimetype, _ = mimetypes.guess_type(name)
+    if name.endswith('.ico'):
+        return 'image/x-icon'
+    return mimetype or 'application/octet-stream'
@@ -0,0 +1,36 @@
+"""
+
+Bismuth Explorer Dashboard Module
+
+Version 2.0.2
+
+"""
+
+from collections import OrderedDict
+from threading import Lock
+
+
+class Dashboard:
+    """Last payload of every home page event.
+
+    The background thread records each payload as it broadcasts it, so a
+    new client can be sent the current state from memory without asking
+    the node or any outside service.
+    """
+
+    def __init__(self):
+        self.events = OrderedDict()
+        self.lock = Lock()
+
+    def update(self, event, payload):
+        with self.lock:
+            self.events[event] = payload
+
+    def get(self, event, default=None):
+        with self.lock:
+            return self.events.get(event, default)
+
+    def snapshot(self):
+        """(event, payload) pairs in the order they were first seen."""
+        with self.lock:
+            return list(self.events.items())
@@ -0,0 +1,115 @@
+"""
+
+Bismuth Explorer Encoding Module
+
+Version 2.0.2
+
+API bodies as JSON, MessagePack or CBOR. JSON is the default and keeps the
+string fields of the original API. The binary formats carry numbers as
+native integers and floats. MessagePack needs the optional msgpack package,
+CBOR the optional cbor2 package, and JSON is encoded with orjson when it is
+installed.
+
+"""
+
+import json
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+MIMETYPES = {'json': 'application/json', 'msgpack': 'application/msgpack', 'cbor': 'application/cbor'}
+
+ACCEPT = {
+    'application/json': 'json',
+    'application/msgpack': 'msgpack',
+    'application/x-msgpack': 'msgpack',
+    'application/vnd.msgpack': 'msgpack',
+    'application/cbor': 'cbor',
+}
+
+# API fields sent as strings in JSON and as numbers in the binary formats
+NUMERIC = {
+    'block': int, 'rank': int, 'blocks': int, 'totalblocks': int, 'latestblock': int, 'firstblock': int,
+    'lastblock': int, 'supply': int, 'holders': int, 'transfers': int, 'lasttime': float,
+    'volume': int, 'senders': int, 'receivers': int, 'transactions': int,
+    'timestamp': float, 'amount': float, 'fee': float, 'reward': float, 'rewards': float, 'fees': float,
+    'balance': float, 'share': float, 'circulating': float, 'total': float,
+}
+
+
+def available():
+    """Formats that can be encoded with the installed packages."""
+    return [f for f, ok in (('json', True), ('msgpack', msgpack), ('cbor', cbor2)) if ok]
+
+
+def negotiate(format_arg, accept):
+    """Format for a request. An explicit format argument wins over Accept.
+
+    Raises ValueError for a format argument that cannot be served. An Accept
+    header offering nothing available falls back to JSON.
+    """
+    formats = available()
+    if format_arg:
+        if format_arg not in formats:
+            raise ValueError("format must be one of {}".format(", ".join(formats)))
+        return format_arg
+
+    offered = []
+    for i, part in enumerate((accept or '').split(',')):
+        media, _, params = part.strip().partition(';')
+        q = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        fmt = ACCEPT.get(media.strip().lower())
+        if fmt in formats and q > 0:
+            offered.append((-q, i, fmt))
+    return min(offered)[2] if offered else 'json'
+
+
+def native(data):
+    """data with the NUMERIC fields turned back into numbers."""
+    if isinstance(data, dict):
+        out = {}
+        for k, v in data.items():
+            kind = NUMERIC.get(k)
+            if kind is not None and isinstance(v, str):
+                try:
+                    v = kind(v)
+                except ValueError:
+                    pass
+            out[k] = native(v)
+        return out
+    if isinstance(data, (list, tuple)):
+        return [native(v) for v in data]
+    return data
+
+
+def dumps(data, fmt='json'):
+    """Body of data in fmt, as bytes."""
+    if fmt == 'msgpack':
+        return msgpack.packb(native(data), use_bin_type=True)
+    if fmt == 'cbor':
+        return cbor2.dumps(native(data))
+    if orjson is not None:
+        try:
+            return orjson.dumps(data)
+        except TypeError:
+            pass
+    return json.dumps(data).encode('utf-8')
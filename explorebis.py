@@ -11,10 +11,11 @@ from gevent.pywsgi import WSGIServer
 from gevent import monkey; monkey.patch_all()
 #from geventwebsocket import WebSocketServer
 
-import json, time, os, sqlite3, requests, datetime, calendar, re, toolsp, bisurl, pyqrcode, logging, socks, connections
-from bs4 import BeautifulSoup
+import io, json, time, os, sqlite3, requests, datetime, calendar, re, toolsp, bisurl, pyqrcode, logging, renderers, httpcache, compression, txfeed, dashboard, blockwatch, scheduler, memtrack, batch, apirouter, ratelimit, exports, subscriptions, encoding, tokencache, classify
 from threading import Lock
 from decimal import *
+from urllib.parse import quote
+from itertools import groupby
 
 from flask import Flask, render_template, session, request, Markup, Response
 from flask_socketio import SocketIO, emit, join_room, leave_room, \
@@ -92,6 +93,90 @@ try:
     app_port = int(config.get('My Explorer', 'webport'))
 except:
     app_port = 8080
+try:
+    confirmations = int(config.get('My Explorer', 'confirmations'))
+except:
+    confirmations = 10
+try:
+    page_cache_mb = int(config.get('My Explorer', 'page_cache_mb'))
+except:
+    page_cache_mb = 64
+try:
+    compress_min = int(config.get('My Explorer', 'compress_min'))
+except:
+    compress_min = 1024
+try:
+    qr_cache_mb = int(config.get('My Explorer', 'qr_cache_mb'))
+except:
+    qr_cache_mb = 8
+try:
+    api_cache_mb = int(config.get('My Explorer', 'api_cache_mb'))
+except:
+    api_cache_mb = 16
+try:
+    block_poll = float(config.get('My Explorer', 'block_poll'))
+except:
+    block_poll = 0.5
+try:
+    batch_max = int(config.get('My Explorer', 'batch_max'))
+except:
+    batch_max = 100
+try:
+    batch_workers = int(config.get('My Explorer', 'batch_workers'))
+except:
+    batch_workers = 8
+try:
+    rate_light = float(config.get('My Explorer', 'rate_light'))
+    rate_light_burst = float(config.get('My Explorer', 'rate_light_burst'))
+except:
+    rate_light = 10.0
+    rate_light_burst = 40.0
+try:
+    rate_heavy = float(config.get('My Explorer', 'rate_heavy'))
+    rate_heavy_burst = float(config.get('My Explorer', 'rate_heavy_burst'))
+except:
+    rate_heavy = 0.2
+    rate_heavy_burst = 5.0
+try:
+    heavy_slots = int(config.get('My Explorer', 'heavy_slots'))
+except:
+    heavy_slots = 4
+try:
+    heavy_queue_timeout = float(config.get('My Explorer', 'heavy_queue_timeout'))
+except:
+    heavy_queue_timeout = 5.0
+try:
+    api_keys = [k.strip() for k in config.get('My Explorer', 'api_keys').split(',') if k.strip()]
+except:
+    api_keys = []
+try:
+    api_key_scale = float(config.get('My Explorer', 'api_key_scale'))
+except:
+    api_key_scale = 10.0
+try:
+    trust_proxy = config.get('My Explorer', 'trust_proxy').lower() == "true"
+except:
+    trust_proxy = False
+try:
+    proxy_hops = int(config.get('My Explorer', 'proxy_hops'))
+except:
+    proxy_hops = 1
+try:
+    export_max_blocks = int(config.get('My Explorer', 'export_max_blocks'))
+except:
+    export_max_blocks = 10000
+try:
+    blocks_max_span = int(config.get('My Explorer', 'blocks_max_span'))
+except:
+    blocks_max_span = 1000
+try:
+    live_max_watch = int(config.get('My Explorer', 'live_max_watch'))
+except:
+    live_max_watch = 100
+try:
+    holders_max = int(config.get('My Explorer', 'holders_max'))
+except:
+    holders_max = 1000
 try:
     l_level = config.get('My Explorer', 'logging')
     if l_level.lower() == "warning":
@@ -157,12 +242,34 @@ app_log.info("Async mode is: {}".format(async_mode))
 app = Flask(__name__)
 app.config['SECRET_KEY'] = app_secret
 socketio = SocketIO(app, async_mode=async_mode, logger=True, engineio_logger=True)
+app.wsgi_app = compression.CompressMiddleware(app.wsgi_app, min_size=compress_min)
+static_assets = compression.StaticAssets(app.static_folder)
 thread = None
 cmc_thread = None
 thread_lock = Lock()
 
 db_hyper = False
 
+# Latest block height seen by the background thread, 0 until it has run
+tip_height = 0
+# Home page state as last broadcast, replayed to new clients
+dash = dashboard.Dashboard()
+# Background jobs, started with the first home page connection
+jobs = scheduler.Scheduler(app_log)
+seen_block = "1"
+try:
+    with open('dump_cmc.txt') as json_file:
+        cmc_dump = json.load(json_file)
+        dash.update('my_info', {k: cmc_dump[k] for k in ('btc', 'usd', 'fiat', 'toc', 'mess')})
+except Exception as e:
+    app_log.warning("dump_cmc.txt not loaded: {}".format(e))
+page_cache = httpcache.PageCache(page_cache_mb * 1024 * 1024)
+qr_cache = httpcache.LRUCache(qr_cache_mb * 1024 * 1024)
+limiter = ratelimit.Limiter(
+    {'light': (rate_light, rate_light_burst), 'heavy': (rate_heavy, rate_heavy_burst)},
+    heavy_slots=heavy_slots, queue_timeout=heavy_queue_timeout,
+    api_keys=api_keys, key_scale=api_key_scale, trust_proxy=trust_proxy, proxy_hops=proxy_hops)
+
 if os.path.isfile('{}hyper.db'.format(db_root)):
     db_hyper = True
     hyper_root = '{}hyper.db'.format(db_root)
@@ -170,6 +277,38 @@ else:
     hyper_root = bis_root # just in case
 
     
+def current_height():
+    if tip_height:
+        return tip_height
+    try:
+        with sqlite3.connect(bis_root) as conn:
+            return conn.execute("SELECT max(block_height) FROM transactions;").fetchone()[0] or 0
+    except sqlite3.Error:
+        return None
+
+def search_height():
+    # A block deep enough can no longer change, key its page on the block itself
+    block = (request.args.get('quicksearch') or "").strip()
+    tip = current_height()
+    if tip and block.isdigit() and 0 < int(block) <= tip - confirmations:
+        return int(block)
+    return tip
+
+def details_height():
+    # A deep transaction can no longer change, key its page on its own block.
+    # Unconfirmed and mempool transactions stay keyed on the tip
+    detail = (request.args.get('mydetail') or "").strip()
+    tip = current_height()
+    if tip and len(detail) == 56:
+        row = classifier.transaction(detail)
+        if row and int(row[0]) <= tip - confirmations:
+            return int(row[0])
+    return tip
+
+def broadcast(event, payload):
+    dash.update(event, payload)
+    socketio.emit(event, payload, namespace='/test')
+
 def escape_html(s):
     return s.replace("+", "%2B").replace("<", "&lt;").replace(">", "&gt;")
 
@@ -186,53 +325,65 @@ def format_alias_entry(address, alias, short):
             f"onclick='copyToClipboard(&quot;{address}&quot;)'>{short}</span>"
         )
 
-def get_50():
-    arg1 = "50"
+def feed_row(r):
+    r_from, r_to = r[2], r[3]
+    a_from, a_to = toolsp.get_alias(r_from), toolsp.get_alias(r_to if r_from != r_to else r_from)
+
+    r_from_d = r_from if r_from in ["Hypernode Payouts", "Development Reward"] else f"{r_from[:5]}....{r_from[-5:]}"
+    r_to_d = f"{r_to[:5]}....{r_to[-5:]}"
+    a_from_html = format_alias_entry(r_from, a_from, r_from_d)
+    a_to_html = format_alias_entry(r_to, a_to, r_to_d)
+
+    r_sig = r[5][:56]
+    r_sig_d = f"{r_sig[:5]}....{r_sig[-5:]}"
+    sig_html = format_alias_entry(r_sig, None, r_sig_d)
+
+    tx_time = time.strftime("%H:%M:%S, %d/%m/%Y", time.gmtime(float(r[1])))
+    block_link = f"<a href='search?quicksearch={r[0]}'>{r[0]}</a>" if r[0] >= 0 else str(r[0])
+
+    return (
+        f"<tr><th scope='row'>{block_link}</th>"
+        f"<td>{tx_time}</td>"
+        f"<td>{a_from_html}</td>"
+        f"<td>{a_to_html}</td>"
+        f"<td>{float(r[4])}</td>"
+        f"<td>{sig_html}</td>"
+        f"<td>{float(r[8])}</td>"
+        f"<td>{float(r[9])}</td></tr>"
+    )
+
+tx_feed = txfeed.TxFeed(feed_row, 50)
+mem_tracker = memtrack.MempoolTracker(toolsp.mem_row)
+# Search input sorted into address, block, hash or txid from the ledger indexes
+classifier = classify.Classifier(bis_root)
+# Addresses watched by /live clients, and the last block pushed to them
+live = subscriptions.Subscriptions(live_max_watch)
+live_height = None
+
+def refresh_feed():
+    # Only transactions not already in the feed are rendered and sent
     try:
-        myall = toolsp.get_one_arg("listlim", arg1)
+        myall = toolsp.get_one_arg("listlim", str(tx_feed.size))
     except:
-        myall = [[0, 0.0, '', '', 0, '', '', '', 0, 0.0, '', '']]
-
-    rows = []
-
-    for r in myall:
-        r_from, r_to = r[2], r[3]
-        a_from, a_to = toolsp.get_alias(r_from), toolsp.get_alias(r_to if r_from != r_to else r_from)
-
-        r_from_d = r_from if r_from in ["Hypernode Payouts", "Development Reward"] else f"{r_from[:5]}....{r_from[-5:]}"
-        r_to_d = f"{r_to[:5]}....{r_to[-5:]}"
-        a_from_html = format_alias_entry(r_from, a_from, r_from_d)
-        a_to_html = format_alias_entry(r_to, a_to, r_to_d)
-
-        r_sig = r[5][:56]
-        r_sig_escaped = escape_html(r_sig)
-        r_sig_d = f"{r_sig[:5]}....{r_sig[-5:]}"
-        sig_html = format_alias_entry(r_sig, None, r_sig_d)
-
-        tx_time = time.strftime("%H:%M:%S, %d/%m/%Y", time.gmtime(float(r[1])))
-        block_link = f"<a href='search?quicksearch={r[0]}'>{r[0]}</a>" if r[0] >= 0 else str(r[0])
-
-        row = (
-            f"<tr><th scope='row'>{block_link}</th>"
-            f"<td>{tx_time}</td>"
-            f"<td>{a_from_html}</td>"
-            f"<td>{a_to_html}</td>"
-            f"<td>{float(r[4])}</td>"
-            f"<td>{sig_html}</td>"
-            f"<td>{float(r[8])}</td>"
-            f"<td>{float(r[9])}</td></tr>"
-        )
-
-        rows.append(row)
-
-    return ''.join(rows)
+        app_log.warning("Transaction List: node not available")
+        return
+
+    change = tx_feed.update(myall)
+    if change is None:
+        app_log.info("No new transactions")
+    elif 'reset' in change:
+        socketio.emit('my_transactions', {'data': change['reset']},namespace='/test')
+        app_log.info("Transaction List Refreshed")
+    else:
+        socketio.emit('my_tx_delta', change,namespace='/test')
+        app_log.info("Transaction List: {} new rows".format(change['rows'].count("<tr>")))
 
 
 def cmc_alt(message):
 
     with open('dump_cmc.txt') as json_file:
         x = json.load(json_file)
-        socketio.emit('my_info',{'btc': x['btc'], 'usd': x['usd'], 'fiat': x['fiat'], 'toc': x['toc'], 'mess': message},namespace='/test')
+        broadcast('my_info', {'btc': x['btc'], 'usd': x['usd'], 'fiat': x['fiat'], 'toc': x['toc'], 'mess': message})
 
     try:
         with open('price_info.txt') as json_file:
@@ -264,7 +415,7 @@ def get_cmc_info(alt_curr, testmess, mystate, this_dev_state):
                 c_usd = "{:.3f}".format(float(y['market_data']['current_price']['usd']))
                 c_cus = "{:.3f}".format(float(y['market_data']['current_price'][ch]))
                 app_log.info("Coingecko Price Thread: Updated OK")
-                socketio.emit('my_info',{'btc': c_btc, 'usd': c_usd, 'fiat': c_cus, 'toc': alt_curr, 'mess': testmess},namespace='/test')
+                broadcast('my_info', {'btc': c_btc, 'usd': c_usd, 'fiat': c_cus, 'toc': alt_curr, 'mess': testmess})
                 cmc = {'btc': c_btc, 'usd': c_usd, 'fiat': c_cus, 'toc': alt_curr, 'mess': testmess}
                 
                 with open('dump_cmc.txt', 'w') as outfile:
@@ -304,18 +455,20 @@ def get_status_info():
         w_uptime = st['uptime']
         n_up = toolsp.display_time(int(w_uptime),4)
         st['uptime'] = n_up
-        socketio.emit('my_status',st,namespace='/test')
+        broadcast('my_status', st)
         app_log.info("Status Thread: OK")
     
     except requests.exceptions.RequestException as e:
         w_uptime = "0"
         n_up = toolsp.display_time(int(w_uptime),4)
+        st = dict(dash.get('my_status', {}))
         st['uptime'] = n_up
-        socketio.emit('my_status',st,namespace='/test')
+        broadcast('my_status', st)
         app_log.error("Status Thread: Error {}".format(e))
 
         
 def get_block_info(last_block):
+    global tip_height
 
     try:
         
@@ -337,7 +490,8 @@ def get_block_info(last_block):
                 blminer = rawminer
             bldiff = d['difficulty']
             x = toolsp.getcirc()
-            socketio.emit('my_latest',{'height': blheight, 'miner': blminer, 'diff': bldiff, 'bltime': bltm, 'btotal': x[0], 'bcirc': x[1]},namespace='/test')
+            broadcast('my_latest', {'height': blheight, 'miner': blminer, 'diff': bldiff, 'bltime': bltm, 'btotal': x[0], 'bcirc': x[1]})
+            tip_height = int(blheight)
             app_log.info("Block Thread: New Block Seen {}".format(blheight))
             r_block = blheight
     
@@ -404,9 +558,10 @@ def get_wallet_servers():
         w_num = len(x)
         
     except:
+        x = []
         w_num = '0'
         
-    socketio.emit('my_w_servers',{'active': str(w_num),'list': live_x},namespace='/test')
+    broadcast('my_w_servers', {'active': str(w_num),'list': live_x})
     app_log.info("Wallet Servers Checked")
     
     return x
@@ -420,81 +575,94 @@ def get_mem_tx_no():
         app_log.info("Number of mempool transactions checked")
     except:
         num_tx = "0"
-        mempool = []
+        mempool = None
         app_log.warning("Error checking mempool transactions")
     
-    socketio.emit('my_mem',{'mem': num_tx},namespace='/test')
+    broadcast('my_mem', {'mem': num_tx})
+
+    if mempool is None:
+        return
+
+    # Only the transactions that arrived or left are rendered and sent
+    change = mem_tracker.update(mempool)
+    if change is not None:
+        socketio.emit("mem_diff", change, namespace="/mem")
 
     if len(mempool) != 0:
         c_toast = "There are {} transactions in local mempool".format(num_tx)
-        mem_list = toolsp.mem_html(mempool)
-        socketio.emit("update", {"data": mem_list}, namespace="/mem")
         socketio.emit("my_toast", {"c_toast": c_toast}, namespace="/test")
-        #print(c_toast)
     else:
-        b = ""
         c_toast = "Nothing in the local mempool"
-        mem_list = toolsp.mem_html(b)
-        socketio.emit("update", {"data": mem_list}, namespace="/mem")
-        #socketio.emit("my_toast", {"c_toast": c_toast}, namespace="/test", broadcast=True)
-        #print(c_toast)
     
     app_log.info(c_toast)
 
 
+def price_job():
+    global cmc_vals
+    vip_mess = get_message_info()
+    cmc_vals = get_cmc_info(alt_curr,vip_mess,not dev_state,dev_state)
+
+def message_job():
+    global cmc_vals
+    vip_mess = get_message_info()
+    cmc_vals = get_cmc_info(alt_curr,vip_mess,False,dev_state)
+
+def push_live(height):
+    # Headers of the new blocks to the 'blocks' room, and their transactions
+    # to the clients watching a sender or recipient. At most 10 blocks are
+    # pushed at once, a rollback pushes the new tip again.
+    global live_height
+    height = int(height)
+    start = height if live_height is None else max(live_height + 1, height - 9)
+    if start > height:
+        start = height
+    live_height = height
+
+    try:
+        with sqlite3.connect(bis_root) as conn:
+            rows = conn.execute("SELECT * FROM transactions WHERE block_height BETWEEN ? AND ? ORDER BY block_height, timestamp;", (start, height)).fetchall()
+    except sqlite3.Error as e:
+        app_log.error("Live push: {}".format(e))
+        return
+
+    for block, block_rows in groupby(rows, key=lambda r: r[0]):
+        block_rows = list(block_rows)
+        socketio.emit('block', exports.block_header(block, block_rows), namespace='/live', room='blocks')
+        if len(live):
+            for sid, txs in live.match([batch.tx_dict(r) for r in block_rows]).items():
+                socketio.emit('address_tx', {'block': str(block), 'txs': txs}, namespace='/live', room=sid)
+
+def new_block():
+    global seen_block
+    height = get_block_info(seen_block)
+    if height != seen_block:
+        seen_block = height
+        refresh_feed()
+        get_mem_tx_no()
+        push_live(height)
+
 def main_info():
-    # Rename to something better
-    # Better timings
-    global cmc_vals, cmc_thread
-    count = 0
-    current_block = "1"
-    last_block = "0"
-    global txlist50
-
-    while True:
-        try:
-            if count % 60 == 0: # check every 10 mins or so
-                vip_mess = get_message_info()
-                if dev_state:
-                    cmc_vals = get_cmc_info(alt_curr,vip_mess,False,dev_state)
-                else:
-                    cmc_vals = get_cmc_info(alt_curr,vip_mess,True,dev_state)
-                
-            else:
-                vip_mess = get_message_info()
-                cmc_vals = get_cmc_info(alt_curr,vip_mess,False,dev_state)
-                
-            if count == 0 or count % 12 == 0:
-                x = get_wallet_servers()
-                
-            get_status_info()
-            get_mem_tx_no()
-            current_block = get_block_info(current_block)
-                            
-            # Refresh tx list
-            if current_block != last_block:
-                txlist50 = get_50()
-                socketio.emit('my_transactions', {'data': txlist50},namespace='/test')
-                app_log.info("Transaction List Refreshed")
-                last_block = current_block
-            else:
-                app_log.info("No new transactions")
-        
-            if count == 299: # Prevent counting forever
-                count = 0
-            else:
-                count += 1
-            
-            time.sleep(10)
+    # Each background job runs on its own schedule, block dependent data
+    # is refreshed as soon as ledger.db shows a new block
+    watcher = blockwatch.BlockWatcher(bis_root, block_poll)
 
-        except Exception as e:
-            app_log.error(f"Error in main_info loop: {str(e)}")
-            app_log.info("Restarting main_info loop in 10 seconds...")
-            # Reset the thread variable so new connections can restart it
-            with thread_lock:
-                cmc_thread = None
-            time.sleep(10)
-            continue
+    def watch_blocks():
+        if watcher.poll() is not None:
+            new_block()
+
+    def node_blocks():
+        # ledger.db not readable, ask the node instead
+        if not watcher.ok:
+            new_block()
+
+    jobs.add('price', price_job, 600, jitter=30, timeout=60)
+    jobs.add('messages', message_job, 10, jitter=1, timeout=10, delay=10)
+    jobs.add('wallet_servers', get_wallet_servers, 120, jitter=10, timeout=30)
+    jobs.add('status', get_status_info, 10, jitter=1, timeout=10)
+    jobs.add('mempool', get_mem_tx_no, 10, jitter=1, timeout=20)
+    jobs.add('blocks', watch_blocks, block_poll, timeout=30)
+    jobs.add('node_blocks', node_blocks, 10, timeout=30)
+    jobs.run()
 
     
 def rich_html(a,c):
@@ -553,11 +721,8 @@ def rich_data(a, c):
 def get_alias_display(alias):
     return alias if alias else "None found"
 
-def generate_qr_code(block):
-    path = f'static/qr_{block}.png'
-    if not os.path.exists(path):
-        pyqrcode.create(block).png(path, scale=3)
-    return path
+def qr_url(payload, scale=3):
+    return "/qr/{}.png?s={}".format(quote(payload, safe=''), scale)
 
 def fetch_address_data(block):
     return toolsp.refresh(block, 1)
@@ -579,7 +744,7 @@ def fetch_by_height(conn, height):
     return c.fetchall()
 
 def build_info_html(block, alias, data):
-    qr_path = f'static/qr_{block}.png'
+    qr_path = qr_url(block)
     return f"""
     <div class="card-deck mb-3 text-left">
       <div class="card mb-4 box-shadow">
@@ -605,43 +770,52 @@ def build_info_html(block, alias, data):
     </div>
     """
 
-def render_transaction_table(all_rows, display_limit):
-    rows_html = ""
-    for x in all_rows:
-        x_open = "HTML NOT SHOWN HERE" if BeautifulSoup(str(x[11]), "html.parser").find() else x[11][:20]
-        txid_short = f"{x[5][:5]}....{x[5][-5:]}"
-        from_d = f"{x[2][:5]}....{x[2][-5:]}"
-        to_d = f"{x[3][:5]}....{x[3][-5:]}"
-        det_str = x[5][:56].replace("+", "%2B").replace("<", "&lt;").replace(">", "&gt;")
-        det_link = f"/details?mydetail={det_str}&myaddress={x[2]}"
-        rows_html += f"""
-        <tr>
-            <td><a href='search?quicksearch={x[0]}'>{x[0]}</a></td>
-            <td>{time.strftime("%Y/%m/%d,%H:%M:%S", time.gmtime(float(x[1])))}</td>
-            <td><a href='search?quicksearch={x[2]}'>{from_d}</a></td>
-            <td><a href='search?quicksearch={x[3]}'>{to_d}</a></td>
-            <td>{x[4]}</td>
-            <td><a href="{det_link}">{x[5][:56]}</a></td>
-            <td>{x[8]}</td>
-            <td>{x[9]}</td>
-            <td>{x[10]}</td>
-            <td>{x_open}</td>
-        </tr>
-        """
-    header = """
-    <table class="table table-striped table-sm address-tx-list" style="font-size: 75%">
-      <thead><tr>
-        <th scope="col">Block</th><th scope="col">Timestamp</th><th scope="col">From</th>
-        <th scope="col">To</th><th scope="col">Amount</th><th scope="col">Transaction ID (txid)</th>
-        <th scope="col">Fee</th><th scope="col">Reward</th><th scope="col">Operation</th>
-        <th scope="col">Message Starts</th>
-      </tr></thead>
-    """
-    heading = "<center><h4>Transaction List</h4></center>" if display_limit == 0 else f"<center><h4>Transaction List</h4><small>({display_limit} tx limit)</small></center>"
-    return f"{heading}{header}{rows_html}</table>"
-        
 #//////////////////
 
+@app.context_processor
+def asset_helpers():
+    return {'asset_url': static_assets.url}
+
+
+@app.route('/assets/<path:url_name>')
+def assets(url_name):
+    found = static_assets.lookup(url_name, request.headers.get('Accept-Encoding'))
+    if found is None:
+        return "Not found", 404
+    body, encoding, etag, mimetype = found
+    resp = Response(body, mimetype=mimetype)
+    resp.set_etag(etag, weak=encoding is not None)
+    resp.headers['Cache-Control'] = compression.IMMUTABLE
+    resp.headers['Vary'] = 'Accept-Encoding'
+    if encoding:
+        resp.headers['Content-Encoding'] = encoding
+    return resp.make_conditional(request)
+
+@app.route('/qr/<path:payload>.png')
+def qr_image(payload):
+    # PNGs are made on demand and kept in memory, the URL fully describes the image
+    scale = request.args.get('s', '3')
+    if not scale.isdigit() or not 1 <= int(scale) <= 8 or len(payload) > 2048:
+        return "Bad QR request", 400
+    key = (payload, int(scale))
+    entry = qr_cache.get(key)
+    if entry is None:
+        try:
+            code = pyqrcode.create(payload)
+        except ValueError:
+            # More data than the largest QR version holds at this error level
+            return "Bad QR request", 400
+        out = io.BytesIO()
+        code.png(out, scale=int(scale))
+        png = out.getvalue()
+        entry = (png, httpcache.strong_etag(png))
+        qr_cache.put(key, entry, len(png))
+    png, etag = entry
+    resp = Response(png, mimetype='image/png')
+    resp.set_etag(etag)
+    resp.headers['Cache-Control'] = compression.IMMUTABLE
+    return resp.make_conditional(request)
+
 # start add robots.txt
 #@app.route('/robots.txt')
 #def noindex():
@@ -669,6 +843,7 @@ def ledger_form():
 
     
 @app.route('/ledgerquery', methods=['POST'])
+@limiter.limit('heavy')
 def ledger_query():
     from calendar import timegm
 
@@ -761,12 +936,13 @@ def ledger_query():
 
     # Render results
     if all_rows and all_rows[0]:
-        starter = render_transaction_table(all_rows, mydisplay)
+        starter = renderers.render_transaction_table(all_rows, mydisplay)
     return render_template("ledgerquery.html", starter=starter, extext=extext, valtext=block_input)
 
 
     
 @app.route('/richest', methods=['GET', 'POST'])
+@limiter.limit('heavy')
 def richest_form():
 
     #print(cmc_vals)
@@ -874,25 +1050,34 @@ def minerquery():
         addressis = addressis + "<tr><th scope='row' align='right' bgcolor='#1f2431'><b>Total Rewards:</b></th><td bgcolor='#212534'>{}</td></tr>".format(str(m_info[4]))
         addressis = addressis + "</table>"
         
-    all = toolsp.miners()
+    window = request.args.get('window') or ""
+    if window not in toolsp.MINER_WINDOWS:
+        window = ""
 
-    send_back = ""
+    rows = []
 
-    j = 1
-    for x in all:
-        thisminer = str(x[0])
-        
-        if len(thisminer) == 56:
-            send_back = send_back + "<tr><th scope='row'> {} </th>\n".format(str(j))
-            if len(str(x[5])) > 0:
-                send_back = send_back + "<td><a href='/minerquery?myaddy={}'>{}</a></td>".format(thisminer,str(x[5]))
-            else:
-                send_back = send_back + "<td><a href='/minerquery?myaddy={}'>{}</a></td>".format(thisminer,thisminer)
-            send_back = send_back + "<td>{}</td>".format(str(x[3]))
-            send_back = send_back + "</tr>"
-            j = j+1
+    if window:
+        all, w_total = toolsp.miner_share(window)
+        for j, x in enumerate(all, 1):
+            thisminer = str(x[0])
+            rows.append("<tr><th scope='row'> {} </th>\n".format(j))
+            rows.append("<td><a href='/minerquery?myaddy={}'>{}</a></td>".format(thisminer, str(x[3]) or thisminer))
+            rows.append("<td>{}</td><td>{:.2f}%</td></tr>".format(x[1], x[4]))
+    else:
+        all = toolsp.miners()
+        j = 1
+        for x in all:
+            thisminer = str(x[0])
+
+            if len(thisminer) == 56:
+                rows.append("<tr><th scope='row'> {} </th>\n".format(j))
+                rows.append("<td><a href='/minerquery?myaddy={}'>{}</a></td>".format(thisminer, str(x[5]) or thisminer))
+                rows.append("<td>{}</td></tr>".format(str(x[3])))
+                j = j+1
+
+    send_back = ''.join(rows)
     
-    return render_template('minerquery.html', miners=send_back, details=addressis)
+    return render_template('minerquery.html', miners=send_back, details=addressis, window=window, windows=list(toolsp.MINER_WINDOWS))
 
 
 @app.route('/wservers', methods=['GET'])
@@ -918,6 +1103,8 @@ def wallet_servers():
     
     
 @app.route('/time_chart')
+@page_cache.cached(current_height)
+@limiter.limit('heavy')
 def b_chart():
 
     ttl = "Recent Bismuth Blocktime"
@@ -940,6 +1127,8 @@ def b_chart():
 
     
 @app.route('/diff_chart')
+@page_cache.cached(current_height)
+@limiter.limit('heavy')
 def d_chart():
 
     ttl = "Recent Bismuth Difficulty"
@@ -1023,11 +1212,7 @@ def url_gen():
     if is_ok:
         receive_str = bisurl.create_url(app_log, "pay", my_add, my_amount, my_op, my_mess)
         clr_str = '<p style="color:green">'
-        if do_qr:
-            receive_qr = pyqrcode.create(receive_str)
-            receive_qr_png = receive_qr.png('static/qr_{}{}.png'.format(my_add, my_amount), scale=2)
-        else:
-            receive_qr_png = ''
+        qr_path = qr_url(receive_str, 2)
     else:
         receive_str = my_r
         clr_str = '<p style="color:red">'
@@ -1046,7 +1231,7 @@ def url_gen():
     plotter.append('<tr><th><center>RESULT</center></th></tr>\n')
     plotter.append('<tr><td align="center"><p></p>{}{}</p><p></p></td></tr>\n'.format(clr_str,receive_str))
     if do_qr:
-        plotter.append('<tr><td align="center"><img src="static/qr_{}{}.png" height="175px"></img></td></tr>\n'.format(my_add, my_amount))
+        plotter.append('<tr><td align="center"><img src="{}" height="175px"></img></td></tr>\n'.format(qr_path))
     plotter.append('</table>\n')    
 
     starter = "" + str(''.join(plotter))
@@ -1055,6 +1240,7 @@ def url_gen():
 
 
 @app.route('/details')
+@page_cache.cached(details_height)
 def detailinfo():
 
     try:
@@ -1137,14 +1323,11 @@ def apihelp():
     else:
         a_text = " ({} record limit)".format(str(mydisplay))
     
-    return render_template('apihelp.html', atext=a_text)
+    return render_template('apihelp.html', atext=a_text, batch_max=batch_max, blocks_max_span=blocks_max_span, holders_max=holders_max)
 
     
-@app.route('/tokens')
-def tokens():
+def issued_html(token_list):
 
-    token_list = toolsp.get_tokens("issued")
-    
     tview = []
     
     for t in token_list:
@@ -1182,12 +1365,27 @@ def tokens():
     tplot = tplot + tview
     tplot.append('</table>\n')
         
-    starter = "" + str(''.join(tplot))
-    
-    return render_template('tokens.html', starter=starter)
+    return "" + str(''.join(tplot))
+
+def daily_record(d):
+    return {"date":time.strftime("%Y-%m-%d", time.gmtime(d[0])),"transfers":str(d[1]),"volume":str(d[2]),"senders":str(d[3]),"receivers":str(d[4])}
+
+def issued_record(t):
+    return {"token":str(t[2]),"issuer":str(t[4]),"supply":str(t[6]),"block":str(t[0]),"txid":str(t[5]),"timestamp":str(t[1])}
+
+# Issued tokens only change with index.db, not with every block
+issued_tokens = tokencache.IssuedTokens('{}index.db'.format(db_root), current_height,
+                                        lambda: toolsp.get_tokens("issued"), issued_html, issued_record)
+
+
+@app.route('/tokens')
+@page_cache.cached(current_height)
+def tokens():
+    return render_template('tokens.html', starter=issued_tokens.fragment())
 
 
 @app.route('/tokenquery')
+@page_cache.cached(current_height)
 def tokenquery():
 
     try:
@@ -1234,7 +1432,14 @@ def tokenquery():
         tview.append('</tr>\n')
         
     tplot = []
-    
+
+    t_stats = toolsp.token_summary(this_token) if this_token else None
+    if t_stats:
+        issuer_d = "{}....{}".format(t_stats[1][:5],t_stats[1][-5:]) if t_stats[1] else ""
+        tplot.append("<p class='text-center' style='font-size: 85%'>Supply <b>{}</b> &middot; <a href='tokenholders?token={}'>Holders</a> <b>{}</b> &middot; Transfers <b>{}</b>".format(t_stats[2],t_stats[0],t_stats[3],t_stats[4]))
+        tplot.append(" &middot; Issued in block <a href='search?quicksearch={0}'>{0}</a> by <a href='tokentxquery?address={1}'>{2}</a>".format(t_stats[5],t_stats[1],issuer_d))
+        tplot.append(" &middot; Last activity in block <a href='search?quicksearch={0}'>{0}</a> on {1}</p>\n".format(t_stats[6],time.strftime("%d/%m/%Y at %H:%M:%S", time.gmtime(float(t_stats[7])))))
+
     tplot.append('<center><h4>{} - List of Transactions</h4></center>'.format(this_token))
     tplot.append('<table style="font-size: 80%" class="table table-striped table-sm">\n')
     tplot.append('<tr><thead>\n')
@@ -1250,7 +1455,63 @@ def tokenquery():
         
     starter = "" + str(''.join(tplot))
     
-    return render_template('tokenquery.html', starter=starter)
+    daily = [daily_record(d) for d in toolsp.token_daily(this_token)] if this_token else []
+
+    return render_template('tokenquery.html', starter=starter, daily=daily)
+
+
+def holders_page(this_token, limit, cursor):
+    # One page of token holders and the cursor of the next page, None on the last page
+    start = toolsp.parse_holders_cursor(cursor) if cursor else (0, None)
+    if start is None:
+        raise ValueError("invalid cursor")
+    rank, after = start
+    rows = toolsp.token_holders(this_token, limit + 1, after)
+    more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = toolsp.holders_cursor(rank + len(rows), rows[-1]) if more else None
+    return [(rank + i + 1, r) for i, r in enumerate(rows)], next_cursor
+
+
+@app.route('/tokenholders')
+@page_cache.cached(current_height)
+def tokenholders():
+
+    this_token = request.args.get('token') or ""
+    try:
+        holders, next_cursor = holders_page(this_token, 100, request.args.get('cursor'))
+    except ValueError:
+        holders, next_cursor = [], None
+
+    tview = []
+
+    for rank, h in holders:
+        holder_d = "{}....{}".format(h[0][:5],h[0][-5:])
+        tview.append('<tr>')
+        tview.append('<td>{}</td>'.format(rank))
+        tview.append("<td><a href='tokentxquery?address={}'>{}</a></td>".format(str(h[0]),holder_d))
+        tview.append('<td>{}</td>'.format(str(h[2])))
+        tview.append('<td>{}</td>'.format(str(h[1])))
+        tview.append('</tr>\n')
+
+    tplot = []
+
+    tplot.append("<center><h4><a href='tokenquery?token={0}'>{0}</a> - Holders</h4></center>".format(this_token))
+    tplot.append('<table style="font-size: 80%" class="table table-striped table-sm">\n')
+    tplot.append('<tr><thead>\n')
+    tplot.append('<th scope="col">Rank</th>\n')
+    tplot.append('<th scope="col">Address</th>\n')
+    tplot.append('<th scope="col">Alias</th>\n')
+    tplot.append('<th scope="col">Balance</th>\n')
+    tplot.append('</thead></tr>\n')
+    tplot = tplot + tview
+    tplot.append('</table>\n')
+    if next_cursor:
+        tplot.append("<p class='text-center'><a href='tokenholders?token={}&cursor={}'>Next</a></p>\n".format(quote(this_token),quote(next_cursor)))
+
+    starter = "" + str(''.join(tplot))
+
+    return render_template('tokenholders.html', starter=starter)
 
 
 @app.route('/tokentxquery')
@@ -1308,6 +1569,18 @@ def tokentxquery():
     tplot = []
     
     tplot.append('<center><h5>Address: {}</h5></center>'.format(this_tkaddy))
+
+    holdings = toolsp.token_holdings(this_tkaddy) if this_tkaddy else []
+    if holdings:
+        tplot.append('<table style="font-size: 80%" class="table table-striped table-sm">\n')
+        tplot.append('<tr><thead>\n')
+        tplot.append('<th scope="col">Token</th>\n')
+        tplot.append('<th scope="col">Balance</th>\n')
+        tplot.append('</thead></tr>\n')
+        for h in holdings:
+            tplot.append("<tr><td><b><a href='tokenquery?token={0}'>{0}</a></b></td><td>{1}</td></tr>\n".format(str(h[0]),str(h[1])))
+        tplot.append('</table>\n')
+
     tplot.append('<table style="font-size: 80%" class="table table-striped table-sm">\n')
     tplot.append('<tr><thead>\n')
     tplot.append('<th scope="col">Token</th>\n')
@@ -1326,18 +1599,18 @@ def tokentxquery():
 
 
 @app.route('/search', methods=['GET'])
+@page_cache.cached(search_height)
 def search_result():
     block = (request.args.get('quicksearch') or "").strip()
-    block_type = toolsp.test(block)
+    block_type = classifier.classify(block)
     extext = ""
     starter = ""
     all_rows = []
 
     with sqlite3.connect(bis_root) as conn:
-        if block_type == 1:
+        if block_type == 'address':
             data = fetch_address_data(block)
             if float(data[0]) or float(data[2]) > 0:
-                generate_qr_code(block)
                 alias = get_alias_display(data[8])
                 extext = build_info_html(block, alias, data)
                 temp_all = fetch_transactions(conn, block)
@@ -1346,15 +1619,20 @@ def search_result():
                 else:
                     all_rows = temp_all[:mydisplay]
             else:
-                all_rows = fetch_block_transactions(conn, block)
-                if not all_rows:
-                    all_rows = [toolsp.get_the_details(block, "")]
-                if not all_rows[0]:
-                    extext = "<center><p style='color:#C70039'>Nothing found for the block, address, txid or hash you entered - perhaps no transactions have been made?</p></center>"
-                else:
-                    extext = "<center><p style='color:#08750A'><b>Transaction found for the txid you entered</b></p></center>"
+                extext = "<center><p style='color:#C70039'>Nothing found for the address you entered - perhaps no transactions have been made?</p></center>"
+
+        elif block_type == 'hash':
+            all_rows = fetch_block_transactions(conn, block)
+            extext = "<center><p style='color:#08750A'><b>Block found for the hash you entered</b></p></center>"
+
+        elif block_type == 'txid':
+            all_rows = [classifier.transaction(block)]
+            if not all_rows[0]:
+                extext = "<center><p style='color:#C70039'>Nothing found for the txid you entered</p></center>"
+            else:
+                extext = "<center><p style='color:#08750A'><b>Transaction found for the txid you entered</b></p></center>"
 
-        elif block_type == 2:
+        elif block_type == 'block':
             if block == "0":
                 all_rows = []
             else:
@@ -1364,484 +1642,397 @@ def search_result():
             else:
                 extext = f"<center><p style='color:#08750A'><b>Block {block} found</b></p></center>"
 
-        elif block_type == 3:
+        else:
             extext = "<center><p style='color:#C70039'>Block, address, txid or hash not found...</p></center>"
 
     if all_rows and all_rows[0]:
-        starter = render_transaction_table(all_rows, mydisplay)
+        starter = renderers.render_transaction_table(all_rows, mydisplay)
 
     return render_template('search.html', starter=starter, extext=extext)
 
     
-@app.route('/api/<param1>/<param2>', methods=['GET'])
-def handler(param1, param2):
+def custom_aliases():
+    # custom.txt lines are alias:address
+    aliases = {}
+    try:
+        with open('custom.txt', 'r') as infile:
+            for line in infile:
+                cust = line.split(':')
+                if len(cust) > 1:
+                    aliases[cust[1].strip()] = cust[0].strip()
+    except OSError:
+        pass
+    return aliases
+
+
+@app.route('/api/batch', methods=['POST'])
+@limiter.limit('heavy', as_json=True)
+def batch_handler():
+    body = request.get_json(silent=True)
+    try:
+        fmt = encoding.negotiate(request.args.get('format'), request.headers.get('Accept'))
+        queries = batch.parse(body, batch_max)
+    except ValueError as e:
+        return httpcache.api_response(json.dumps({"error": str(e)}), 'none', status=406)
+    except batch.BatchError as e:
+        return httpcache.api_response(json.dumps({"error": str(e)}), 'none', status=400)
 
-    if param1 == "node":
-        failed_response = {"error":"request failed","data":"unable to connect to node - try again later"}
+    results = batch.run(queries, bis_root, batch_workers, custom_aliases())
+    return httpcache.api_response(encoding.dumps({"results": results}, fmt), 'none',
+                                  mimetype=encoding.MIMETYPES[fmt], variant=fmt)
 
-        try:
-            s = socks.socksocket()
-            s.settimeout(10)
-            s.connect((ip, int(port)))
-        except:
-            response = failed_response
-            return json.dumps(response), 400, {'Content-Type': 'application/json', 'Cache-Control': 'no-cache'}
-    
-        #balance
-        if "balanceget:" in param2 or "balancegetjson:" in param2:
-            arg1 = (param2.split(":")[1]).strip()
-            
-            try:
-                response = toolsp.get_one_arg("balancegetjson",arg1)    
-                return json.dumps(response), 200, {'Content-Type': 'application/json', 'Cache-Control': 'no-cache'}
-            except:
-                response = failed_response          
-                return json.dumps(response), 400, {'Content-Type': 'application/json', 'Cache-Control': 'no-cache'}
-        
-        #difficulty
-        elif param2 == "diffget" or param2 == "diffgetjson":
-        
-            try:
-                response = toolsp.get_no_arg("diffgetjson")
-                return json.dumps(response), 200, {'Content-Type': 'application/json', 'Cache-Control': 'no-cache'}
-            except:
-                response = failed_response          
-                return json.dumps(response), 400, {'Content-Type': 'application/json', 'Cache-Control': 'no-cache'}             
-            
-        elif param2 == "difflast" or param2 == "difflastjson":
-            
-            try:
-                response = toolsp.get_no_arg("difflastjson")    
-                return json.dumps(response), 200, {'Content-Type': 'application/json', 'Cache-Control': 'no-cache'}
-            except:
-                response = failed_response          
-                return json.dumps(response), 400, {'Content-Type': 'application/json', 'Cache-Control': 'no-cache'}
-        
-        #mempool
-        elif param2 == "mpget" or param2 == "mpgetjson":
-            
-            try:
-                mems = toolsp.get_no_arg("mpgetjson")
-                
-                if len(mems) == 0:
-                    response = {"mempool":"empty"}
-                else:
-                    response = mems
-                
-                return json.dumps(response), 200, {'Content-Type': 'application/json', 'Cache-Control': 'no-cache'}
-            except:
-                response = failed_response          
-                return json.dumps(response), 400, {'Content-Type': 'application/json', 'Cache-Control': 'no-cache'}
-            
-        #lastblock
-        elif param2 == "blocklast" or param2 == "blocklastjson":
-            
-            try:
-                response = toolsp.get_no_arg("blocklastjson")
-                return json.dumps(response), 200, {'Content-Type': 'application/json', 'Cache-Control': 'no-cache'}
-            except:
-                response = failed_response          
-                return json.dumps(response), 400, {'Content-Type': 'application/json', 'Cache-Control': 'no-cache'}
-            
-        #get specific block
-        elif "blockget:" in param2 or "blockgetjson:" in param2:
-            arg1 = param2.split(":")[1]
-            
-            try:
-                response = toolsp.get_one_arg("blockgetjson",arg1)
-                return json.dumps(response), 200, {'Content-Type': 'application/json', 'Cache-Control': 'no-cache'}
-            except:
-                response = failed_response          
-                return json.dumps(response), 400, {'Content-Type': 'application/json', 'Cache-Control': 'no-cache'}
-        
-        #transactions for an address
-        elif "addlistlim:" in param2 or "addlistlimjson:" in param2:
-            arg_list = param2.split(":")
-            arg1 = arg_list[1]
-            arg2 = arg_list[2]
-            
-            if int(arg2) > txlistlim:
-                arg2 = str(txlistlim)
-        
-            try:
-                response = toolsp.get_two_arg("addlistlimjson",arg1,arg2)
-                return json.dumps(response), 200, {'Content-Type': 'application/json', 'Cache-Control': 'no-cache'}
-            except:
-                response = failed_response          
-                return json.dumps(response), 400, {'Content-Type': 'application/json', 'Cache-Control': 'no-cache'}
-        
-        #list of last x transactions
-        elif "listlim:" in param2 or "listlimjson:" in param2:
-            arg_list = param2.split(":")
-            arg1 = arg_list[1]
-            
-            if int(arg1) > txlistlim:
-                arg1 = str(txlistlim)
-            
-            try:
-                response = toolsp.get_one_arg("listlimjson",arg1)
-                return json.dumps(response), 200, {'Content-Type': 'application/json', 'Cache-Control': 'no-cache'}
-            except:
-                response = failed_response          
-                return json.dumps(response), 400, {'Content-Type': 'application/json', 'Cache-Control': 'no-cache'}
-        
-        #get alias for address
-        elif "aliasget:" in param2:
-            arg1 = param2.split(":")[1]
-            
-            try:
-                add_all = toolsp.get_one_arg("aliasget",arg1)
-                add_all = add_all[0][0]
-                
-                with open('custom.txt', 'r') as infile:
-                    for line in infile:
-                        cust = line.split(':')
-                        if arg1 == cust[1].strip():
-                            add_all = cust[0].strip()
-                            #print(r_alias)
-            
-                response = {"address": arg1,
-                            "alias": add_all}
-                    
-                return json.dumps(response), 200, {'Content-Type': 'application/json', 'Cache-Control': 'no-cache'}
-            except:
-                response = failed_response          
-                return json.dumps(response), 400, {'Content-Type': 'application/json', 'Cache-Control': 'no-cache'}
-            
-        #address from alias
-        elif "addfromalias:" in param2:
 
-            arg1 = param2.split(":")[1]
-            
-            try:
-                add_all = toolsp.get_one_arg("addfromalias",arg1)
-                
-                with open('custom.txt', 'r') as infile:
-                    for line in infile:
-                        cust = line.split(':')
-                        if arg1 == cust[0].strip():
-                            add_all = cust[1].strip()
-
-                response = {"alias": arg1,
-                            "address": add_all}
-                    
-                return json.dumps(response), 200, {'Content-Type': 'application/json', 'Cache-Control': 'no-cache'}
-            except: 
-                response = failed_response          
-                return json.dumps(response), 400, {'Content-Type': 'application/json', 'Cache-Control': 'no-cache'}
-            
-        #validate an address
-        elif "addvalidate:" in param2:
+api = apirouter.Router(current_height, confirmations, app_log, limiter,
+                       httpcache.LRUCache(api_cache_mb * 1024 * 1024))
 
-            arg1 = param2.split(":")[1]
-            
-            try:
-                val_result = toolsp.get_one_arg("addvalidate",arg1)
-                
-                response = {"address": arg1,
-                            "status": val_result}
-                    
-                return json.dumps(response), 200, {'Content-Type': 'application/json', 'Cache-Control': 'no-cache'}
-            except:
-                response = failed_response          
-                return json.dumps(response), 400, {'Content-Type': 'application/json', 'Cache-Control': 'no-cache'}
-        
-        #get node peers
-        elif param2 == "peersget":
-        
-            try:            
-                response = toolsp.get_no_arg("peersget")
-                return json.dumps(response), 200, {'Content-Type': 'application/json', 'Cache-Control': 'no-cache'}
-            except:
-                response = failed_response          
-                return json.dumps(response), 400, {'Content-Type': 'application/json', 'Cache-Control': 'no-cache'}
-            
-        #get node status
-        elif param2 == "statusget" or param2 == "statusjson":
 
-            try:
-                response = toolsp.get_no_arg("statusjson")
-                return json.dumps(response), 200, {'Content-Type': 'application/json', 'Cache-Control': 'no-cache'}
-            except:
-                response = failed_response          
-                return json.dumps(response), 400, {'Content-Type': 'application/json', 'Cache-Control': 'no-cache'}
+def tx_fields(b):
+    return {"block":str(b[0]),"timestamp":str(b[1]),"from":str(b[2]),"to":str(b[3]),"amount":str(b[4]),"txid":str(b[5][:56]),"fee":str(b[8]),"reward":str(b[9]),"operation":str(b[10]),"openfield":str(b[11])}
 
-        #get network announcement
-        elif param2 == "annget":
-            
-            try:
-                response = toolsp.get_no_arg("annget")
-                return json.dumps(response), 200, {'Content-Type': 'application/json', 'Cache-Control': 'no-cache'}
-            except:
-                response = failed_response          
-                return json.dumps(response), 400, {'Content-Type': 'application/json', 'Cache-Control': 'no-cache'}
-            
-        else:
-            r = "invalid request"
-            e = {"error":r}
-            return json.dumps(e), 400, {'Content-Type': 'application/json', 'Cache-Control': 'no-cache'}
-            
-    elif param1 == "info":
-        
-        if param2 == "totalsupply":
-            x = toolsp.getcirc()
-            return json.dumps(str(x[0])).strip('"'), 200, {'Content-Type': 'application/json', 'Cache-Control': 'no-cache'}
-        if param2 == "coinsupply":
-            x = toolsp.getcirc()
-            return json.dumps({'circulating':str(x[1]),'total':str(x[0])}), 200, {'Content-Type': 'application/json', 'Cache-Control': 'no-cache'}
-        if param2 == "total":
-            x = toolsp.getcirc()
-            return str(x[0]), 200, {'Content-Type': 'text/plain', 'Cache-Control': 'no-cache'}
-        if param2 == "circulating":
-            x = toolsp.getcirc()
-            return str(x[1]), 200, {'Content-Type': 'text/plain', 'Cache-Control': 'no-cache'}
-        if param2 == "wservers":
-            w = toolsp.xws()
-            return json.dumps(w), 200, {'Content-Type': 'application/json', 'Cache-Control': 'no-cache'}
-            
-    elif param1 == "getall":
-        getaddress = str(param2)
-        a_display = False
-        if "f:" in getaddress:
-            a_display = True
-            getaddress = getaddress.split(":")[1]
-            #print(getaddress)
-            #print(a_display)
-            
-        if "a:" in getaddress:
-            getaddress = toolsp.rev_alias(getaddress)
-            
-        if not getaddress or not toolsp.s_test(getaddress):
-            r = "invalid data entered"
-            e = {"error":r}
-            return json.dumps(e), 400, {'Content-Type': 'application/json', 'Cache-Control': 'no-cache'}
-        else:
-            all = []
-            conn = sqlite3.connect(bis_root)
-            c = conn.cursor()
-            if mydisplay == 0 or a_display:
-                c.execute("SELECT * FROM transactions WHERE address = ? OR recipient = ? ORDER BY abs(block_height) DESC;", (getaddress,getaddress))
-            else:
-                c.execute("SELECT * FROM transactions WHERE address = ? OR recipient = ? ORDER BY abs(block_height) DESC LIMIT ?;", (getaddress,getaddress,str(mydisplay)))
-            all = c.fetchall()
-            c.close()
-            conn.close()
-            if not all:
-                r = "address does not exist or invalid address"
-                e = {"error":r}
-                return json.dumps(e), 404, {'Content-Type': 'application/json', 'Cache-Control': 'no-cache'}
-            else:
-                y = []
-                #y.append({"address":getaddress,"limit":"{} records".format(str(mydisplay))})
-                
-                for b in all:
-                    y.append({"block":str(b[0]),"timestamp":str(b[1]),"from":str(b[2]),"to":str(b[3]),"amount":str(b[4]),"txid":str(b[5][:56]),"fee":str(b[8]),"reward":str(b[9]),"operation":str(b[10]),"openfield":str(b[11])})
-                
-                return json.dumps(y), 200, {'Content-Type': 'application/json', 'Cache-Control': 'no-cache'}
-
-    elif param1 == "block":
-        myblock = str(param2)
-        if not myblock or not myblock.isalnum():
-            r = "invalid data entered"
-            e = {"error":r}
-            return json.dumps(e), 400, {'Content-Type': 'application/json', 'Cache-Control': 'no-cache'}
-        else:
-            all = []
-            conn = sqlite3.connect(bis_root)
-            c = conn.cursor()
-            c.execute("SELECT * FROM transactions WHERE block_height = ?;", (myblock,))
-            all = c.fetchall()
-
-            c.close()
-            conn.close()
-
-            if not all:
-                r = "block does not exist or invalid block"
-                e = {"error":r}
-                return json.dumps(e), 404, {'Content-Type': 'application/json', 'Cache-Control': 'no-cache'}
-            else:
-                y = []
-                
-                for b in all:
-                    y.append({"block":str(b[0]),"timestamp":str(b[1]),"from":str(b[2]),"to":str(b[3]),"amount":str(b[4]),"txid":str(b[5][:56]),"fee":str(b[8]),"reward":str(b[9]),"operation":str(b[10]),"openfield":str(b[11])})
-                
-                return json.dumps(y), 200, {'Content-Type': 'application/json', 'Cache-Control': 'no-cache'}
-                
-    elif param1 == "txid":
-            gettxid = str(param2)
-            
-            get_txid = gettxid.replace(".","/")
-        
-            m_stuff = "{}".format(str(get_txid))
-            
-            if toolsp.d_test(get_txid) == False:
-            
-                r = "txid does not appear to exist or invalid data"
-                e = {"error":r}
-                return json.dumps(e), 404, {'Content-Type': 'application/json', 'Cache-Control': 'no-cache'}
+def tx_details(m_detail):
+    return {"block":str(m_detail[0]),"timestamp":str(m_detail[1]),"from":str(m_detail[2]),"to":str(m_detail[3]),"amount":str(m_detail[4]),"signature":str(m_detail[5]),"txid":str(m_detail[5][:56]),"pubkey":str(m_detail[6]),"hash":str(m_detail[7]),"fee":str(m_detail[8]),"reward":str(m_detail[9]),"operation":str(m_detail[10]),"openfield":str(m_detail[11])}
 
-            else:
-            
-                m_detail = toolsp.get_the_details(m_stuff,None)
-        
-                
-                if m_detail:
-                
-                    y = []
-                    y.append({"block":str(m_detail[0]),"timestamp":str(m_detail[1]),"from":str(m_detail[2]),"to":str(m_detail[3]),"amount":str(m_detail[4]),"signature":str(m_detail[5]),"txid":str(m_detail[5][:56]),"pubkey":str(m_detail[6]),"hash":str(m_detail[7]),"fee":str(m_detail[8]),"reward":str(m_detail[9]),"operation":str(m_detail[10]),"openfield":str(m_detail[11])})
-                    
-                    return json.dumps(y), 200, {'Content-Type': 'application/json', 'Cache-Control': 'no-cache'}
-                    
-                else:
-                    
-                    r = "txid does not appear to exist or invalid data"
-                    e = {"error":r}
-                    return json.dumps(e), 404, {'Content-Type': 'application/json', 'Cache-Control': 'no-cache'}
-                
-    elif param1 == "txidadd":
-            gettxid = str(param2)
-        
-            tx_add_info = gettxid.split(":")
-            get_txid = tx_add_info[0]
-            get_add_from = tx_add_info[1]
-                        
-            get_txid = get_txid.replace(".","/")
-        
-            m_stuff = "{}".format(str(get_txid))
-            
-            if toolsp.d_test(get_txid) == False:
-            
-                r = "txid does not appear to exist or invalid data"
-                e = {"error":r}
-                return json.dumps(e), 404, {'Content-Type': 'application/json', 'Cache-Control': 'no-cache'}
+def first_block(args, data):
+    return data[0]["block"]
 
-            else:
-            
-                m_detail = toolsp.get_the_details(m_stuff,get_add_from)
-                    
-                if m_detail:
-                
-                    y = []
-                    y.append({"block":str(m_detail[0]),"timestamp":str(m_detail[1]),"from":str(m_detail[2]),"to":str(m_detail[3]),"amount":str(m_detail[4]),"signature":str(m_detail[5]),"txid":str(m_detail[5][:56]),"pubkey":str(m_detail[6]),"hash":str(m_detail[7]),"fee":str(m_detail[8]),"reward":str(m_detail[9]),"operation":str(m_detail[10]),"openfield":str(m_detail[11])})
-                    
-                    return json.dumps(y), 200, {'Content-Type': 'application/json', 'Cache-Control': 'no-cache'}
-                    
-                else:
-                    
-                    r = "txid does not appear to exist or invalid data"
-                    e = {"error":r}
-                    return json.dumps(e), 404, {'Content-Type': 'application/json', 'Cache-Control': 'no-cache'}
-
-    elif param1 == "richlist":
-        rich_num = str(param2)
-        nog = True
-        ra = toolsp.richones()
-        rag =[(r[0],float(r[1]),r[2]) for r in ra]
-        rag = sorted(rag, key=lambda address: address[1], reverse=True)
-        
-        if rich_num.isdigit():
-            rich_num = int(rich_num)
-            if rich_num > len(rag):
-                rich_num = len(rag)
-        elif rich_num == "all":
-            rich_num = len(rag)
-        else:
-            nog = False
-        
-        nt = range(rich_num)
-            
-        if nog:
-            y = [{"rank":str(g+1),"address":str(rag[g][0]),"alias":str(rag[g][2]),"balance":('%.8f' % rag[g][1])} for g in nt]
-            return json.dumps(y), 200, {'Content-Type': 'application/json', 'Cache-Control': 'no-cache'}
-        else:
-            r = "invalid request"
-            e = {"error":r}
-            return json.dumps(e), 400, {'Content-Type': 'application/json', 'Cache-Control': 'no-cache'}
-
-    elif param1 == "miners":
-        miner_num = str(param2)
-        mog = True
-        ma = toolsp.miners()
+def tx_limit(value):
+    if not value.isdigit():
+        raise apirouter.ApiError("invalid request, limit must be a number")
+    return str(min(int(value), txlistlim))
+
+
+#node
+@api.endpoint('node', 'balanceget', 'balancegetjson', args=1, node=True, policy='volatile', height=None)
+def api_balance(address):
+    return toolsp.get_one_arg("balancegetjson",address.strip())
+
+@api.endpoint('node', 'diffget', 'diffgetjson', node=True, policy='volatile', height=None)
+def api_diff():
+    return toolsp.get_no_arg("diffgetjson")
+
+@api.endpoint('node', 'difflast', 'difflastjson', node=True)
+def api_difflast():
+    return toolsp.get_no_arg("difflastjson")
+
+@api.endpoint('node', 'mpget', 'mpgetjson', node=True, policy='volatile', height=None)
+def api_mempool():
+    mems = toolsp.get_no_arg("mpgetjson")
+    return mems if len(mems) else {"mempool":"empty"}
+
+@api.endpoint('node', 'blocklast', 'blocklastjson', node=True, policy='volatile')
+def api_blocklast():
+    return toolsp.get_no_arg("blocklastjson")
+
+@api.endpoint('node', 'blockget', 'blockgetjson', args=1, node=True, policy='block', height=lambda args, data: args[0])
+def api_blockget(height):
+    return toolsp.get_one_arg("blockgetjson",height)
+
+@api.endpoint('node', 'addlistlim', 'addlistlimjson', args=2, node=True)
+def api_addlistlim(address, limit):
+    return toolsp.get_two_arg("addlistlimjson",address,tx_limit(limit))
+
+@api.endpoint('node', 'listlim', 'listlimjson', args=1, node=True)
+def api_listlim(limit):
+    return toolsp.get_one_arg("listlimjson",tx_limit(limit))
+
+@api.endpoint('node', 'aliasget', args=1, node=True)
+def api_aliasget(address):
+    alias = custom_aliases().get(address)
+    if alias is None:
+        alias = toolsp.get_one_arg("aliasget",address)[0][0]
+    return {"address": address, "alias": alias}
+
+@api.endpoint('node', 'addfromalias', args=1, node=True)
+def api_addfromalias(alias):
+    address = {a: addr for addr, a in custom_aliases().items()}.get(alias)
+    if address is None:
+        address = toolsp.get_one_arg("addfromalias",alias)
+    return {"alias": alias, "address": address}
+
+@api.endpoint('node', 'addvalidate', args=1, policy='final', height=lambda args, data: 0)
+def api_addvalidate(address):
+    return {"address": address, "status": "valid" if classify.is_address(address) else "invalid"}
+
+@api.endpoint('node', 'peersget', node=True, policy='volatile', height=None)
+def api_peers():
+    return toolsp.get_no_arg("peersget")
+
+@api.endpoint('node', 'statusget', 'statusjson', node=True, policy='volatile', height=None)
+def api_status():
+    return toolsp.get_no_arg("statusjson")
+
+@api.endpoint('node', 'annget', node=True, policy='volatile', height=None)
+def api_announcement():
+    return toolsp.get_no_arg("annget")
+
+
+#info
+@api.endpoint('info', 'totalsupply', serializer=lambda x: json.dumps(str(x[0])).strip('"'))
+def api_totalsupply():
+    return toolsp.getcirc()
+
+@api.endpoint('info', 'coinsupply')
+def api_coinsupply():
+    x = toolsp.getcirc()
+    return {'circulating':str(x[1]),'total':str(x[0])}
+
+@api.endpoint('info', 'total', mimetype='text/plain', serializer=lambda x: str(x[0]))
+def api_total():
+    return toolsp.getcirc()
+
+@api.endpoint('info', 'circulating', mimetype='text/plain', serializer=lambda x: str(x[1]))
+def api_circulating():
+    return toolsp.getcirc()
+
+@api.endpoint('info', 'wservers', policy='volatile', height=None)
+def api_wservers():
+    return toolsp.xws()
+
+@api.endpoint('info', 'jobs', policy='none', height=None)
+def api_jobs():
+    return jobs.stats()
+
+@api.endpoint('info', 'endpoints', policy='none', height=None)
+def api_endpoints():
+    return api.stats()
+
+@api.endpoint('info', 'apicache', policy='none', height=None)
+def api_apicache():
+    return api.cache_stats()
+
+@api.endpoint('info', 'ratelimit', policy='none', height=None)
+def api_ratelimit():
+    return limiter.stats()
+
+@api.endpoint('info', 'live', policy='none', height=None)
+def api_live():
+    return dict(live.stats(), height=live_height)
+
+
+@api.endpoint('getall', rate='heavy')
+def api_getall(getaddress):
+    a_display = False
+    if "f:" in getaddress:
+        a_display = True
+        getaddress = getaddress.split(":")[1]
         
-        if miner_num.isdigit():
-            miner_num = int(miner_num)
-            if miner_num > len(ma):
-                miner_num = len(ma)
-        elif miner_num == "all":
-            miner_num = len(ma)
-        else:
-            mog = False
+    if "a:" in getaddress:
+        getaddress = toolsp.rev_alias(getaddress)
         
-        nt = range(miner_num)
-            
-        if mog:
-            y = [{"rank":str(g+1),"address":str(ma[g][0]),"blocks":str(ma[g][3]),"rewards":str(ma[g][4]),"alias":str(ma[g][5])} for g in nt]
-            return json.dumps(y), 200, {'Content-Type': 'application/json', 'Cache-Control': 'no-cache'}
-        else:
-            r = "invalid request"
-            e = {"error":r}
-            return json.dumps(e), 400, {'Content-Type': 'application/json', 'Cache-Control': 'no-cache'}
-
-    elif param1 == "aminer":
-        #getaddress = str(param2)
-        temp_addy = str(param2)
-        if "a:" in temp_addy:
-            getaddress = toolsp.rev_alias(temp_addy)
-        else:
-            getaddress = temp_addy
-        if toolsp.s_test(getaddress):
-            m_info = toolsp.bgetvars(getaddress)
-            #print(m_info)
-            if m_info:
-                x = {'address':str(m_info[0]),'alias':str(m_info[5]),'latestblock':str(m_info[1]),'firstblock':str(m_info[2]),'totalblocks':str(m_info[3]),'rewards':str(m_info[4])}
-                return json.dumps(x), 200, {'Content-Type': 'application/json', 'Cache-Control': 'no-cache'}                
-            else:
-                r = "{} is not a miner....".format(getaddress)
-                e = {"error":r}
-                return json.dumps(e), 404, {'Content-Type': 'application/json', 'Cache-Control': 'no-cache'}
+    if not getaddress or not toolsp.s_test(getaddress):
+        raise apirouter.ApiError("invalid data entered")
+
+    with sqlite3.connect(bis_root) as conn:
+        if mydisplay == 0 or a_display:
+            all = conn.execute("SELECT * FROM transactions WHERE address = ? OR recipient = ? ORDER BY abs(block_height) DESC;", (getaddress,getaddress)).fetchall()
         else:
-            r = "invalid address"
-            e = {"error":r}
-            return json.dumps(e), 400, {'Content-Type': 'application/json', 'Cache-Control': 'no-cache'}
+            all = conn.execute("SELECT * FROM transactions WHERE address = ? OR recipient = ? ORDER BY abs(block_height) DESC LIMIT ?;", (getaddress,getaddress,str(mydisplay))).fetchall()
+    if not all:
+        raise apirouter.ApiError("address does not exist or invalid address", 404)
+    return [tx_fields(b) for b in all]
 
-    elif param1 == "diffhist":
-        diff_num = str(param2)
-        dog = False
-        
-        conn = sqlite3.connect(bis_root)
-        conn.text_factory = str
-        c = conn.cursor()
-                
-        if diff_num.isdigit():
-            if int(diff_num) > 10:
-                dog = True
-                c.execute("SELECT * FROM misc ORDER BY block_height DESC LIMIT ?;", (diff_num,))
-                d_result = c.fetchall()
-                y = []
-                d_result = list(reversed(d_result))
-                
-                for v in d_result:
-                    b = str(v[0])
-                    d = {b:v[1],}
-                    y.append(d)
-                
-                c.close()
-                conn.close()
+@api.endpoint('block', policy='block', height=lambda args, data: args[0])
+def api_block(myblock):
+    if not myblock or not myblock.isalnum():
+        raise apirouter.ApiError("invalid data entered")
 
-        if dog:
-            #y = [b,d]
-            return json.dumps(y), 200, {'Content-Type': 'application/json', 'Cache-Control': 'no-cache'}
-        else:
-            r = "invalid request value must be more than 10"
-            e = {"error":r}
-            return json.dumps(e), 404, {'Content-Type': 'application/json', 'Cache-Control': 'no-cache'}            
-        
+    with sqlite3.connect(bis_root) as conn:
+        all = conn.execute("SELECT * FROM transactions WHERE block_height = ?;", (myblock,)).fetchall()
+    if not all:
+        raise apirouter.ApiError("block does not exist or invalid block", 404)
+    return [tx_fields(b) for b in all]
+
+@api.endpoint('txid', policy='block', height=first_block)
+def api_txid(gettxid):
+    get_txid = gettxid.replace(".","/")
+    m_detail = toolsp.get_the_details(get_txid,None) if toolsp.d_test(get_txid) else None
+    if not m_detail:
+        raise apirouter.ApiError("txid does not appear to exist or invalid data", 404)
+    return [tx_details(m_detail)]
+
+@api.endpoint('txidadd', policy='block', height=first_block)
+def api_txidadd(gettxid):
+    get_txid, sep, get_add_from = gettxid.partition(":")
+    if not sep:
+        raise apirouter.ApiError("invalid request, use txid:address")
+    get_txid = get_txid.replace(".","/")
+    m_detail = toolsp.get_the_details(get_txid,get_add_from) if toolsp.d_test(get_txid) else None
+    if not m_detail:
+        raise apirouter.ApiError("txid does not appear to exist or invalid data", 404)
+    return [tx_details(m_detail)]
+
+def list_count(value, length):
+    # A number or the word all
+    if value.isdigit():
+        return min(int(value), length)
+    if value == "all":
+        return length
+    raise apirouter.ApiError("invalid request")
+
+@api.endpoint('richlist', rate='heavy')
+def api_richlist(rich_num):
+    ra = toolsp.richones()
+    rag =[(r[0],float(r[1]),r[2]) for r in ra]
+    rag = sorted(rag, key=lambda address: address[1], reverse=True)
+    nt = range(list_count(rich_num, len(rag)))
+    return [{"rank":str(g+1),"address":str(rag[g][0]),"alias":str(rag[g][2]),"balance":('%.8f' % rag[g][1])} for g in nt]
+
+@api.endpoint('miners')
+def api_miners(miner_num):
+    ma = toolsp.miners()
+    nt = range(list_count(miner_num, len(ma)))
+    return [{"rank":str(g+1),"address":str(ma[g][0]),"blocks":str(ma[g][3]),"rewards":str(ma[g][4]),"alias":str(ma[g][5])} for g in nt]
+
+@api.endpoint('minershare')
+def api_minershare(param2):
+    # window or window:address
+    share_args = param2.split(":")
+    window = share_args[0]
+    if window not in toolsp.MINER_WINDOWS:
+        raise apirouter.ApiError("invalid window, use one of {}".format(", ".join(toolsp.MINER_WINDOWS)))
+
+    ms, w_total = toolsp.miner_share(window)
+    y = [{"rank":str(g+1),"address":str(m[0]),"alias":str(m[3]),"blocks":str(m[1]),"rewards":str(m[2]),"share":"{:.4f}".format(m[4])} for g, m in enumerate(ms)]
+
+    if len(share_args) > 1:
+        y = [m for m in y if m["address"] == share_args[1]]
+        if not y:
+            raise apirouter.ApiError("{} has not mined in the last {}".format(share_args[1], window), 404)
+
+    return {"window":window,"totalblocks":str(w_total),"miners":y}
+
+@api.endpoint('aminer')
+def api_aminer(temp_addy):
+    if "a:" in temp_addy:
+        getaddress = toolsp.rev_alias(temp_addy)
     else:
-        r = "invalid request"
-        e = {"error":r}
-        return json.dumps(e), 400, {'Content-Type': 'application/json', 'Cache-Control': 'no-cache'}
-        
-    s.close()
+        getaddress = temp_addy
+    if not toolsp.s_test(getaddress):
+        raise apirouter.ApiError("invalid address")
+    m_info = toolsp.bgetvars(getaddress)
+    if not m_info:
+        raise apirouter.ApiError("{} is not a miner....".format(getaddress), 404)
+    return {'address':str(m_info[0]),'alias':str(m_info[5]),'latestblock':str(m_info[1]),'firstblock':str(m_info[2]),'totalblocks':str(m_info[3]),'rewards':str(m_info[4])}
+
+@api.endpoint('diffhist')
+def api_diffhist(diff_num):
+    if not diff_num.isdigit() or int(diff_num) <= 10:
+        raise apirouter.ApiError("invalid request value must be more than 10", 404)
+
+    with sqlite3.connect(bis_root) as conn:
+        d_result = conn.execute("SELECT * FROM misc ORDER BY block_height DESC LIMIT ?;", (diff_num,)).fetchall()
+    return [{str(v[0]): v[1]} for v in reversed(d_result)]
+
+
+@api.endpoint('token')
+def api_token(this_token):
+    t = toolsp.token_summary(this_token)
+    if not t:
+        raise apirouter.ApiError("token not found", 404)
+    return {"token":str(t[0]),"issuer":str(t[1]),"supply":str(t[2]),"holders":str(t[3]),"transfers":str(t[4]),"firstblock":str(t[5]),"lastblock":str(t[6]),"lasttime":str(t[7])}
+
+@api.endpoint('tokens', 'issued')
+def api_tokens_issued():
+    return issued_tokens.records()
+
+@api.endpoint('tokendaily')
+def api_tokendaily(this_token):
+    return [daily_record(d) for d in toolsp.token_daily(this_token)]
+
+@api.endpoint('tokenbalances')
+def api_tokenbalances(address):
+    return [{"token":str(t),"balance":str(b)} for t, b in toolsp.token_holdings(address)]
+
+
+def export_response(chunks, fmt, filename):
+    resp = Response(chunks, mimetype=exports.FORMATS[fmt])
+    resp.headers['Content-Disposition'] = 'attachment; filename="{}.{}"'.format(filename, fmt)
+    resp.headers['Cache-Control'] = 'no-cache'
+    return resp
+
+def export_error(message, status=400):
+    return httpcache.api_response(json.dumps({"error": message}), 'none', status=status)
+
+def export_range(name, parse):
+    # Optional from_<name> and to_<name> query arguments
+    low, high = request.args.get('from_' + name), request.args.get('to_' + name)
+    return (parse(low, False) if low else None, parse(high, True) if high else None)
+
+def export_date(value, end):
+    # YYYY-MM-DD in UTC, an end date covers the whole day
+    stamp = calendar.timegm(time.strptime(value, "%Y-%m-%d"))
+    return stamp + 86399.999 if end else stamp
+
+
+@app.route('/export/address/<address>.<fmt>')
+@limiter.limit('heavy', as_json=True)
+def export_address(address, fmt):
+    if fmt not in exports.FORMATS:
+        return export_error("format must be csv or ndjson")
+    if not toolsp.s_test(address):
+        return export_error("invalid address")
+    try:
+        heights = export_range('height', lambda value, end: int(value))
+        times = export_range('date', export_date)
+    except ValueError:
+        return export_error("invalid range, heights are numbers and dates are YYYY-MM-DD")
+    return export_response(exports.address_history(bis_root, address, fmt, heights, times), fmt, address)
+
+
+@app.route('/export/blocks/<int:start>-<int:end>.<fmt>')
+@limiter.limit('heavy', as_json=True)
+def export_blocks(start, end, fmt):
+    if fmt not in exports.FORMATS:
+        return export_error("format must be csv or ndjson")
+    if end < start or end - start + 1 > export_max_blocks:
+        return export_error("block range must be increasing and at most {} blocks".format(export_max_blocks))
+    return export_response(exports.block_range(bis_root, start, end, fmt), fmt, "blocks_{}-{}".format(start, end))
+
+
+@app.route('/export/richlist.<fmt>')
+@limiter.limit('heavy', as_json=True)
+def export_richlist(fmt):
+    if fmt not in exports.FORMATS:
+        return export_error("format must be csv or ndjson")
+    if not os.path.exists('tools.db'):
+        return export_error("richlist not available yet", 503)
+    return export_response(exports.richlist('tools.db', fmt, bis_limit), fmt, "richlist_{}".format(current_height()))
+
+
+@app.route('/api/blocks/<int:start>-<int:end>')
+@limiter.limit('light', as_json=True)
+def api_blocks(start, end):
+    if end < start or end - start + 1 > blocks_max_span:
+        return export_error("block range must be increasing and at most {} blocks".format(blocks_max_span))
+    compact = request.args.get('compact', '').lower() in ('1', 'true', 'yes')
+
+    resp = Response(exports.blocks_json(bis_root, start, end, compact), mimetype='application/json')
+    resp.headers['Cache-Control'] = httpcache.API_POLICIES[
+        httpcache.block_policy(end, current_height(), confirmations)]
+    return resp
+
+
+@app.route('/api/token/<path:this_token>/holders')
+@limiter.limit('light', as_json=True)
+def api_token_holders(this_token):
+    limit = request.args.get('limit', '100')
+    if not limit.isdigit() or not 0 < int(limit) <= holders_max:
+        return export_error("limit must be a number from 1 to {}".format(holders_max))
+    try:
+        fmt = encoding.negotiate(request.args.get('format'), request.headers.get('Accept'))
+        holders, next_cursor = holders_page(this_token, int(limit), request.args.get('cursor'))
+    except ValueError as e:
+        return export_error(str(e))
+
+    body = {"token": this_token, "next": next_cursor,
+            "holders": [{"rank": str(rank), "address": str(h[0]), "alias": str(h[2]), "balance": str(h[1])} for rank, h in holders]}
+    return httpcache.api_response(encoding.dumps(body, fmt), 'tip', height=current_height(),
+                                  mimetype=encoding.MIMETYPES[fmt], variant=fmt)
+
+
+@app.route('/api/<param1>/<param2>', methods=['GET'])
+def handler(param1, param2):
+    return api.dispatch(param1, param2)
 
 
 @socketio.on('my_event', namespace='/test')
@@ -1911,30 +2102,25 @@ def ping_pong():
     emit('my_pong')
 
 
-@socketio.on('connect', namespace='/test')
-def test_connect():
+def start_background():
     global cmc_thread
-    get_status_info()
 
     with thread_lock:
         if cmc_thread is None:
             cmc_thread = socketio.start_background_task(target=main_info)
-            app_log.info("New Connection, New Thread {}".format(request.sid))
-        else:
-            try:
-                with open('dump_cmc.txt') as json_file:
-                    x = json.load(json_file)
-                    emit('my_info',{'btc': x['btc'], 'usd': x['usd'], 'fiat': x['fiat'], 'toc': x['toc'], 'mess': x['mess']},namespace='/test')
-            except Exception as e:
-                app_log.error(f"Error loading cmc info: {str(e)}")
-            app_log.info("New Connection {}".format(request.sid))
-            try:
-                x = get_wallet_servers()
-            except Exception as e:
-                app_log.error(f"Error getting wallet servers: {str(e)}")
-                x = []
-            
-            emit('my_transactions', {'data': txlist50},namespace='/test')
+            app_log.info("Background jobs started")
+
+
+@socketio.on('connect', namespace='/test')
+def test_connect():
+    # Everything a new client needs is already in memory, no node or web calls here
+    start_background()
+    app_log.info("New Connection {}".format(request.sid))
+
+    for event, payload in dash.snapshot():
+        emit(event, payload)
+    if tx_feed.rows:
+        emit('my_transactions', {'data': tx_feed.html()})
 
 
 @socketio.on('disconnect', namespace='/test')
@@ -1952,9 +2138,57 @@ def mem_connect():
     """
     connect
     """
-    get_mem_tx_no()
+    start_background()
+    emit('mem_snapshot', {'rows': mem_tracker.snapshot()})
     app_log.info('Mempool client connected {}'.format(request.sid))
-    
+
+
+@socketio.on('connect', namespace='/live')
+def live_connect():
+    start_background()
+    emit('live_status', {'height': current_height()})
+
+
+@socketio.on('subscribe', namespace='/live')
+def live_subscribe(message):
+    """
+    {"blocks": true, "addresses": [...]}, either may be left out
+    """
+    message = message if isinstance(message, dict) else {}
+    addresses = message.get('addresses') or []
+    if not isinstance(addresses, list) or not all(isinstance(a, str) and 0 < len(a) <= 128 for a in addresses):
+        emit('live_error', {'error': 'addresses must be a list of addresses'})
+        return
+    try:
+        watched = live.watch(request.sid, addresses)
+    except ValueError as e:
+        emit('live_error', {'error': str(e)})
+        return
+    if message.get('blocks'):
+        join_room('blocks')
+    emit('subscribed', {'blocks': 'blocks' in rooms(), 'addresses': watched})
+
+
+@socketio.on('unsubscribe', namespace='/live')
+def live_unsubscribe(message):
+    """
+    {"blocks": true, "addresses": [...]}, "addresses": true removes them all
+    """
+    message = message if isinstance(message, dict) else {}
+    if message.get('blocks'):
+        leave_room('blocks')
+    if 'addresses' in message:
+        addresses = message['addresses']
+        watched = live.unwatch(request.sid, addresses if isinstance(addresses, list) else None)
+    else:
+        watched = live.unwatch(request.sid, [])
+    emit('subscribed', {'blocks': 'blocks' in rooms(), 'addresses': watched})
+
+
+@socketio.on('disconnect', namespace='/live')
+def live_disconnect():
+    live.unwatch(request.sid)
+
     
 if __name__ == '__main__':
 
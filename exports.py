@@ -0,0 +1,152 @@
+"""
+
+Bismuth Explorer Export Module
+
+Version 2.0.2
+
+CSV and NDJSON exports streamed straight from SQLite cursors in batches, so
+memory use does not grow with the size of the export. The last line is a
+trailer with the number of rows and the sha256 of every line before it:
+
+    csv     # rows=<n> sha256=<hex>
+    ndjson  {"rows": <n>, "sha256": "<hex>"}
+
+"""
+
+import io
+import csv
+import json
+import sqlite3
+import hashlib
+from itertools import groupby
+
+import batch
+
+FORMATS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+TX_COLUMNS = ('block', 'timestamp', 'from', 'to', 'amount', 'txid', 'fee', 'reward', 'operation', 'openfield')
+TX_SELECT = ("SELECT block_height, timestamp, address, recipient, amount, substr(signature, 1, 56), "
+             "fee, reward, operation, openfield FROM transactions")
+
+RICH_COLUMNS = ('rank', 'address', 'alias', 'balance')
+
+
+def encode(rows, columns, fmt):
+    if fmt == 'ndjson':
+        return ''.join(json.dumps(dict(zip(columns, row))) + '\n' for row in rows)
+    out = io.StringIO()
+    csv.writer(out, lineterminator='\n').writerows(rows)
+    return out.getvalue()
+
+
+def export(db_path, query, params, columns, fmt, batch_size=1000, transform=None):
+    """Generator of utf-8 chunks for the rows of query.
+
+    transform, if given, maps each fetched batch and the number of rows
+    already sent to the rows to write.
+    """
+    digest = hashlib.sha256()
+    count = 0
+
+    if fmt == 'csv':
+        header = encode([columns], columns, fmt).encode('utf-8')
+        digest.update(header)
+        yield header
+
+    conn = sqlite3.connect('file:{}?mode=ro'.format(db_path), uri=True)
+    try:
+        cursor = conn.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            if transform is not None:
+                rows = transform(rows, count)
+            chunk = encode(rows, columns, fmt).encode('utf-8')
+            digest.update(chunk)
+            count += len(rows)
+            yield chunk
+    finally:
+        conn.close()
+
+    if fmt == 'ndjson':
+        yield (json.dumps({"rows": count, "sha256": digest.hexdigest()}) + '\n').encode('utf-8')
+    else:
+        yield "# rows={} sha256={}\n".format(count, digest.hexdigest()).encode('utf-8')
+
+
+def address_history(db_path, address, fmt, heights=(None, None), times=(None, None), batch_size=1000):
+    """Transactions from or to address, oldest first, optionally within a
+    block height range and a timestamp range."""
+    query = TX_SELECT + " WHERE (address = ? OR recipient = ?)"
+    params = [address, address]
+    for column, (low, high) in (('block_height', heights), ('timestamp', times)):
+        if low is not None:
+            query += " AND {} >= ?".format(column)
+            params.append(low)
+        if high is not None:
+            query += " AND {} <= ?".format(column)
+            params.append(high)
+    query += " ORDER BY block_height, timestamp"
+    return export(db_path, query, params, TX_COLUMNS, fmt, batch_size)
+
+
+def block_range(db_path, start, end, fmt, batch_size=1000):
+    """Transactions of blocks start to end inclusive, in block order."""
+    query = TX_SELECT + " WHERE block_height BETWEEN ? AND ? ORDER BY block_height, timestamp"
+    return export(db_path, query, (start, end), TX_COLUMNS, fmt, batch_size)
+
+
+def richlist(tools_path, fmt, min_balance=0, batch_size=1000):
+    """Richlist of tools.db, highest balance first, with ranks."""
+    def ranked(rows, sent):
+        return [(sent + i + 1, r[0], r[1], '%.8f' % r[2]) for i, r in enumerate(rows)]
+
+    query = "SELECT address, alias, balance FROM richlist WHERE balance >= ? ORDER BY balance DESC"
+    return export(tools_path, query, (min_balance,), RICH_COLUMNS, fmt, batch_size, transform=ranked)
+
+
+def block_header(height, rows):
+    """Summary of one block from its transactions, with numbers as strings
+    like the rest of the JSON API."""
+    reward_rows = [r for r in rows if float(r[9] or 0) > 0]
+    miner = reward_rows[0] if reward_rows else rows[-1]
+    return {
+        "block": str(height),
+        "hash": str(miner[7]),
+        "timestamp": str(max(float(r[1]) for r in rows)),
+        "miner": str(miner[3]),
+        "reward": str(sum(float(r[9] or 0) for r in rows)),
+        "fees": str(sum(float(r[8] or 0) for r in rows)),
+        "transactions": str(len(rows)),
+    }
+
+
+def blocks_json(db_path, start, end, compact=False, batch_size=1000):
+    """JSON array of the blocks start to end, read in one range scan and
+    streamed one block at a time. Compact mode leaves out the transactions."""
+    conn = sqlite3.connect('file:{}?mode=ro'.format(db_path), uri=True)
+    try:
+        cursor = conn.execute(
+            "SELECT * FROM transactions WHERE block_height BETWEEN ? AND ? ORDER BY block_height, timestamp",
+            (start, end))
+
+        def fetched():
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    return
+                yield from rows
+
+        yield b'['
+        first = True
+        for height, rows in groupby(fetched(), key=lambda r: r[0]):
+            rows = list(rows)
+            block = block_header(height, rows)
+            if not compact:
+                block["txs"] = [batch.tx_dict(r) for r in rows]
+            yield (('' if first else ',') + json.dumps(block)).encode('utf-8')
+            first = False
+        yield b']'
+    finally:
+        conn.close()
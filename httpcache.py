@@ -0,0 +1,176 @@
+"""
+
+Bismuth Explorer HTTP Cache Module
+
+Version 2.0.2
+
+"""
+
+import time
+import hashlib
+import functools
+from threading import Lock
+from collections import OrderedDict
+
+from flask import request, Response
+
+
+class LRUCache:
+    """Least recently used cache bounded by the total size of its values."""
+
+    def __init__(self, max_bytes, max_entries=None):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.size = 0
+        self.hits = self.misses = self.evictions = 0
+        self._items = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def put(self, key, value, size):
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.size -= old[1]
+            self._items[key] = (value, size)
+            self.size += size
+            while self.size > self.max_bytes or (self.max_entries and len(self._items) > self.max_entries):
+                _, (_, evicted) = self._items.popitem(last=False)
+                self.size -= evicted
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.size = 0
+
+    def stats(self):
+        return {
+            'entries': len(self._items),
+            'bytes': self.size,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+
+def strong_etag(body):
+    """Strong validator for a response body."""
+    return hashlib.sha1(body).hexdigest()
+
+
+def conditional(body, etag, last_modified, mimetype='text/html', cache_control=None):
+    """Build a response carrying validators and answer If-None-Match /
+    If-Modified-Since with a 304 when they match."""
+    resp = Response(body, mimetype=mimetype)
+    resp.set_etag(etag)
+    resp.last_modified = last_modified
+    if cache_control:
+        resp.headers['Cache-Control'] = cache_control
+    return resp.make_conditional(request)
+
+
+# Cache-Control for API responses by policy:
+#   final     data of a block deep enough that it can no longer change
+#   recent    the same data for a block still near the tip
+#   tip       data that changes only when a new block arrives
+#   volatile  data that changes between blocks (mempool, node status)
+#   none      errors and anything else that must not be stored
+API_POLICIES = {
+    'final': 'public, max-age=31536000, immutable',
+    'recent': 'public, max-age=10, stale-while-revalidate=30',
+    'tip': 'public, max-age=15, stale-while-revalidate=60',
+    'volatile': 'public, max-age=5, stale-while-revalidate=15',
+    'none': 'no-cache',
+}
+
+
+def height_etag(height, path):
+    """Strong validator for a response that only changes with a block height."""
+    return '{}-{}'.format(height, hashlib.sha1(path.encode('utf-8')).hexdigest()[:16])
+
+
+def block_policy(height, tip, confirmations):
+    """'final' once a block is confirmations deep, 'recent' before."""
+    try:
+        if tip and int(height) > 0 and tip - int(height) >= confirmations:
+            return 'final'
+    except (TypeError, ValueError):
+        pass
+    return 'recent'
+
+
+def api_response(body, policy, height=None, mimetype='application/json', status=200, variant=None):
+    """API response with the Cache-Control of its policy.
+
+    With a height the ETag is derived from it and the request path, so a
+    client revalidating a response for an unchanged height gets a 304. A
+    'recent' block can still be replaced by a reorg, or appear above the
+    tip, without its height changing, so its ETag is taken from the body.
+    variant names the format chosen from the Accept header, if any, so the
+    response varies on Accept and each format has its own ETag.
+    """
+    if height is None or status != 200:
+        resp = Response(body, status=status, mimetype=mimetype)
+        resp.headers['Cache-Control'] = API_POLICIES[policy if status == 200 else 'none']
+        if variant is not None:
+            resp.vary.add('Accept')
+        return resp
+    resp = Response(body, mimetype=mimetype)
+    path = request.full_path if variant in (None, 'json') else request.full_path + ';' + variant
+    if policy == 'recent':
+        data = body.encode('utf-8') if isinstance(body, str) else body
+        resp.set_etag(strong_etag(path.encode('utf-8') + data))
+    else:
+        resp.set_etag(height_etag(height, path))
+    resp.headers['Cache-Control'] = API_POLICIES[policy]
+    if variant is not None:
+        resp.vary.add('Accept')
+    return resp.make_conditional(request)
+
+
+class PageCache:
+    """Rendered page cache keyed by route, query arguments and chain height.
+
+    Each cached view names a height function. It returns the block height
+    the page depends on for the current request, or None to bypass the
+    cache. A page for a deep block can key on that block, so it stays
+    valid while the chain grows. Volatile pages key on the tip.
+    """
+
+    def __init__(self, max_bytes):
+        self.store = LRUCache(max_bytes)
+
+    def cached(self, height_for):
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                height = height_for()
+                if height is None:
+                    return view(*args, **kwargs)
+
+                key = (request.path, tuple(sorted(request.args.items(multi=True))), height)
+                entry = self.store.get(key)
+                if entry is None:
+                    rv = view(*args, **kwargs)
+                    if not isinstance(rv, str):
+                        return rv
+                    body = rv.encode('utf-8')
+                    entry = (body, strong_etag(body), int(time.time()))
+                    self.store.put(key, entry, len(body))
+                body, etag, last_modified = entry
+                return conditional(body, etag, last_modified)
+            return wrapper
+        return decorator
@@ -0,0 +1,55 @@
+"""
+
+Bismuth Explorer Mempool Tracker Module
+
+Version 2.0.2
+
+"""
+
+from collections import OrderedDict
+from threading import Lock
+
+
+class MempoolTracker:
+    """Local mempool keyed by txid, with every row rendered once.
+
+    update() is given the full mempool from the node and returns only the
+    transactions that arrived and the txids that left since the last call.
+    """
+
+    def __init__(self, render):
+        self.render = render
+        self.rows = OrderedDict()
+        self.lock = Lock()
+
+    @staticmethod
+    def txid(tx):
+        return str(tx['signature'])[:56]
+
+    def __len__(self):
+        return len(self.rows)
+
+    def update(self, mempool):
+        """Replace the tracked mempool.
+
+        Returns None when nothing changed, else {'add': [[txid, html], ...],
+        'remove': [txid, ...]}.
+        """
+        fresh = OrderedDict((self.txid(tx), tx) for tx in mempool or [])
+
+        with self.lock:
+            removed = [t for t in self.rows if t not in fresh]
+            added = [[t, self.render(tx)] for t, tx in fresh.items() if t not in self.rows]
+            for t in removed:
+                del self.rows[t]
+            for t, row in added:
+                self.rows[t] = row
+
+        if not added and not removed:
+            return None
+        return {'add': added, 'remove': removed}
+
+    def snapshot(self):
+        """[txid, html] pairs for a new client."""
+        with self.lock:
+            return [[t, row] for t, row in self.rows.items()]
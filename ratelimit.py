@@ -0,0 +1,160 @@
+"""
+
+Bismuth Explorer Rate Limit Module
+
+Version 2.0.2
+
+Token buckets per client and rate class, plus admission control for the
+heavy class. A client is its API key when it sends one, its IP otherwise.
+Heavy requests also need one of a fixed number of slots. A request that
+cannot get a slot within the queue timeout is turned away with 429 and
+Retry-After, so a few scrapers cannot occupy every worker.
+
+"""
+
+import math
+import time
+import json
+import functools
+from threading import Lock
+from collections import OrderedDict
+
+from flask import request, Response
+from gevent.lock import BoundedSemaphore
+
+
+class TokenBuckets:
+    """One bucket per (rate class, client), least recently seen dropped first."""
+
+    def __init__(self, rates, max_clients=100000):
+        # rates: class -> (tokens per second, burst)
+        self.rates = rates
+        self.max_clients = max_clients
+        self.buckets = OrderedDict()
+        self.lock = Lock()
+
+    def take(self, rate_class, client, scale=1.0):
+        """0 if a token was taken, else seconds until one is available."""
+        rate, burst = self.rates[rate_class]
+        rate, burst = rate * scale, burst * scale
+        now = time.time()
+        key = (rate_class, client)
+        with self.lock:
+            bucket = self.buckets.pop(key, None)
+            if bucket is None:
+                tokens = burst
+            else:
+                tokens = min(burst, bucket[0] + (now - bucket[1]) * rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0
+            else:
+                wait = (1 - tokens) / rate if rate > 0 else 60
+            self.buckets[key] = (tokens, now)
+            while len(self.buckets) > self.max_clients:
+                self.buckets.popitem(last=False)
+        return wait
+
+
+class Limiter:
+
+    def __init__(self, rates, heavy_slots=4, queue_timeout=5.0, api_keys=(), key_scale=10.0,
+                 trust_proxy=False, proxy_hops=1, max_clients=100000):
+        self.buckets = TokenBuckets(rates, max_clients)
+        self.slots = BoundedSemaphore(heavy_slots)
+        self.heavy_slots = heavy_slots
+        self.queue_timeout = queue_timeout
+        self.api_keys = set(api_keys)
+        self.key_scale = key_scale
+        self.trust_proxy = trust_proxy
+        self.proxy_hops = max(proxy_hops, 1)
+
+        self.counts = {name: {'allowed': 0, 'limited': 0} for name in rates}
+        self.admitted = self.rejected = self.queued = self.in_flight = 0
+
+    def client(self):
+        key = request.headers.get('X-API-Key') or request.args.get('apikey')
+        if key and key in self.api_keys:
+            return 'key:' + key, self.key_scale
+        if self.trust_proxy and request.headers.get('X-Forwarded-For'):
+            # Each trusted proxy appends the address it saw, anything to the
+            # left of those comes from the client and can be made up
+            hops = [h.strip() for h in request.headers['X-Forwarded-For'].split(',')]
+            return hops[-min(self.proxy_hops, len(hops))], 1.0
+        return request.remote_addr, 1.0
+
+    def acquire(self, rate_class):
+        """0 when the request may run, else the Retry-After in seconds.
+
+        After 0 for the heavy class, release() must be called when done.
+        """
+        client, scale = self.client()
+        wait = self.buckets.take(rate_class, client, scale)
+        if wait:
+            self.counts[rate_class]['limited'] += 1
+            return wait
+        self.counts[rate_class]['allowed'] += 1
+
+        if rate_class != 'heavy':
+            return 0
+        self.queued += 1
+        try:
+            got = self.slots.acquire(timeout=self.queue_timeout)
+        finally:
+            self.queued -= 1
+        if not got:
+            self.rejected += 1
+            return 1
+        self.admitted += 1
+        self.in_flight += 1
+        return 0
+
+    def release(self, rate_class):
+        if rate_class == 'heavy':
+            self.in_flight -= 1
+            self.slots.release()
+
+    def too_many(self, wait, as_json=True):
+        retry = str(max(1, int(math.ceil(wait))))
+        if as_json:
+            resp = Response(json.dumps({"error": "too many requests", "retry_after": int(retry)}),
+                            status=429, mimetype='application/json')
+        else:
+            resp = Response("Too many requests, please retry in {} seconds".format(retry),
+                            status=429, mimetype='text/plain')
+        resp.headers['Retry-After'] = retry
+        resp.headers['Cache-Control'] = 'no-cache'
+        return resp
+
+    def limit(self, rate_class, as_json=False):
+        """Decorator applying a rate class to a view."""
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                wait = self.acquire(rate_class)
+                if wait:
+                    return self.too_many(wait, as_json)
+                try:
+                    rv = view(*args, **kwargs)
+                except BaseException:
+                    self.release(rate_class)
+                    raise
+                if isinstance(rv, Response) and rv.is_streamed:
+                    # A streamed body holds its slot until it has been sent
+                    rv.call_on_close(lambda: self.release(rate_class))
+                else:
+                    self.release(rate_class)
+                return rv
+            return wrapper
+        return decorator
+
+    def stats(self):
+        return {
+            'classes': self.counts,
+            'heavy_slots': self.heavy_slots,
+            'in_flight': self.in_flight,
+            'queued': self.queued,
+            'admitted': self.admitted,
+            'rejected': self.rejected,
+            'clients': len(self.buckets.buckets),
+        }
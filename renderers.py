@@ -0,0 +1,70 @@
+"""
+
+Bismuth Explorer Rendering Module
+
+Version 2.0.2
+
+"""
+
+import re
+import time
+from html import escape
+from urllib.parse import quote
+
+# Anything that an HTML parser would turn into a tag, comment or declaration
+MARKUP = re.compile(r'<[A-Za-z!/?]')
+
+TX_TABLE_HEADER = """
+    <table class="table table-striped table-sm address-tx-list" style="font-size: 75%">
+      <thead><tr>
+        <th scope="col">Block</th><th scope="col">Timestamp</th><th scope="col">From</th>
+        <th scope="col">To</th><th scope="col">Amount</th><th scope="col">Transaction ID (txid)</th>
+        <th scope="col">Fee</th><th scope="col">Reward</th><th scope="col">Operation</th>
+        <th scope="col">Message Starts</th>
+      </tr></thead>
+    """
+
+
+def has_markup(text):
+    """True if text contains something that looks like HTML markup."""
+    return MARKUP.search(str(text)) is not None
+
+
+def short(value):
+    """First and last five characters of an address or txid."""
+    return f"{value[:5]}....{value[-5:]}"
+
+
+def transaction_row(x):
+    """One ledger row as a table row, every field escaped."""
+    txid = x[5][:56]
+    block = escape(str(x[0]))
+    sender = escape(str(x[2]))
+    recipient = escape(str(x[3]))
+    openfield = str(x[11])
+    x_open = "HTML NOT SHOWN HERE" if has_markup(openfield) else escape(openfield[:20])
+    det_link = escape(f"/details?mydetail={quote(txid, safe='/')}&myaddress={quote(str(x[2]), safe='')}")
+    return (
+        f"<tr><td><a href='search?quicksearch={block}'>{block}</a></td>"
+        f"<td>{time.strftime('%Y/%m/%d,%H:%M:%S', time.gmtime(float(x[1])))}</td>"
+        f"<td><a href='search?quicksearch={sender}'>{escape(short(str(x[2])))}</a></td>"
+        f"<td><a href='search?quicksearch={recipient}'>{escape(short(str(x[3])))}</a></td>"
+        f"<td>{escape(str(x[4]))}</td>"
+        f"<td><a href=\"{det_link}\">{escape(txid)}</a></td>"
+        f"<td>{escape(str(x[8]))}</td>"
+        f"<td>{escape(str(x[9]))}</td>"
+        f"<td>{escape(str(x[10]))}</td>"
+        f"<td>{x_open}</td></tr>\n"
+    )
+
+
+def render_transaction_table(all_rows, display_limit):
+    """Transaction list table for ledger rows, built with a single join."""
+    if display_limit == 0:
+        heading = "<center><h4>Transaction List</h4></center>"
+    else:
+        heading = f"<center><h4>Transaction List</h4><small>({display_limit} tx limit)</small></center>"
+    parts = [heading, TX_TABLE_HEADER]
+    parts.extend(transaction_row(x) for x in all_rows)
+    parts.append("</table>")
+    return "".join(parts)
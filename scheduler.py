@@ -0,0 +1,133 @@
+"""
+
+Bismuth Explorer Scheduler Module
+
+Version 2.0.2
+
+Runs background jobs in their own greenlets, each on its own interval, so a
+slow price lookup no longer holds up node status or block updates.
+
+"""
+
+import time
+import random
+import logging
+
+import gevent
+from gevent.lock import BoundedSemaphore
+
+
+class Job:
+
+    def __init__(self, name, func, interval, jitter=0.0, timeout=None, concurrency=1, delay=0.0):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.jitter = jitter
+        self.timeout = timeout
+        self.delay = delay
+        self.slots = BoundedSemaphore(concurrency)
+
+        self.runs = self.failures = self.timeouts = self.skipped = 0
+        self.running = 0
+        self.last_start = self.last_success = self.last_error_time = None
+        self.last_duration = self.max_duration = 0.0
+        self.last_error = ""
+
+    def next_delay(self):
+        if self.jitter:
+            return max(self.interval + random.uniform(-self.jitter, self.jitter), 0)
+        return self.interval
+
+    def stats(self):
+        return {
+            'interval': self.interval,
+            'runs': self.runs,
+            'failures': self.failures,
+            'timeouts': self.timeouts,
+            'skipped': self.skipped,
+            'running': self.running,
+            'last_start': self.last_start,
+            'last_success': self.last_success,
+            'last_duration': round(self.last_duration, 4),
+            'max_duration': round(self.max_duration, 4),
+            'last_error': self.last_error,
+            'last_error_time': self.last_error_time,
+        }
+
+
+class Scheduler:
+    """Periodic jobs with interval, jitter, timeout and a concurrency limit.
+
+    A run that is still going when the job is due again takes another slot
+    if the job has one, otherwise that run is skipped. The timeout is a
+    gevent.Timeout, so it interrupts jobs blocked on network I/O, not ones
+    busy in C code such as a long SQLite query. A run that returns after its
+    deadline counts as timed out, even when the job caught the Timeout.
+    """
+
+    def __init__(self, logger=None):
+        self.log = logger or logging.getLogger(__name__)
+        self.jobs = {}
+        self.greenlets = []
+
+    def add(self, name, func, interval, jitter=0.0, timeout=None, concurrency=1, delay=0.0):
+        job = Job(name, func, interval, jitter, timeout, concurrency, delay)
+        self.jobs[name] = job
+        if self.greenlets:
+            self.greenlets.append(gevent.spawn(self._loop, job))
+        return job
+
+    def start(self):
+        for job in self.jobs.values():
+            self.greenlets.append(gevent.spawn(self._loop, job))
+
+    def run(self):
+        """Start every job and block until they are all stopped."""
+        self.start()
+        gevent.joinall(self.greenlets)
+
+    def stop(self):
+        gevent.killall(self.greenlets)
+        self.greenlets = []
+
+    def _loop(self, job):
+        if job.delay:
+            gevent.sleep(job.delay)
+        while True:
+            if job.slots.acquire(blocking=False):
+                gevent.spawn(self._run, job)
+            else:
+                job.skipped += 1
+                self.log.debug("Job {} still running, skipped".format(job.name))
+            gevent.sleep(job.next_delay())
+
+    def _run(self, job):
+        job.running += 1
+        job.runs += 1
+        job.last_start = time.time()
+        try:
+            with gevent.Timeout(job.timeout):
+                job.func()
+            # Job bodies with a bare except swallow the Timeout and return late
+            if job.timeout is not None and time.time() - job.last_start >= job.timeout:
+                raise gevent.Timeout(job.timeout)
+            job.last_success = time.time()
+        except gevent.Timeout:
+            job.timeouts += 1
+            job.last_error = "timed out after {}s".format(job.timeout)
+            job.last_error_time = time.time()
+            self.log.error("Job {} timed out after {}s".format(job.name, job.timeout))
+        except Exception as e:
+            job.failures += 1
+            job.last_error = str(e)
+            job.last_error_time = time.time()
+            self.log.error("Job {} failed: {}".format(job.name, e))
+        finally:
+            job.last_duration = time.time() - job.last_start
+            job.max_duration = max(job.max_duration, job.last_duration)
+            job.running -= 1
+            job.slots.release()
+
+    def stats(self):
+        return {name: job.stats() for name, job in self.jobs.items()}
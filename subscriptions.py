@@ -0,0 +1,75 @@
+"""
+
+Bismuth Explorer Subscriptions Module
+
+Version 2.0.2
+
+Watched addresses of the /live clients. The index goes from address to the
+clients watching it, so a new block costs one set lookup per sender and
+recipient, however many clients are connected.
+
+"""
+
+from threading import Lock
+
+
+class Subscriptions:
+
+    def __init__(self, max_per_client=100):
+        self.max_per_client = max_per_client
+        self.watchers = {}  # address -> set of sids
+        self.watched = {}   # sid -> set of addresses
+        self.lock = Lock()
+
+    def __len__(self):
+        return len(self.watchers)
+
+    def watch(self, sid, addresses):
+        """Add addresses for sid, returns everything sid now watches.
+
+        Raises ValueError when sid would watch more than max_per_client.
+        """
+        with self.lock:
+            mine = self.watched.get(sid, set())
+            new = set(addresses) - mine
+            if len(mine) + len(new) > self.max_per_client:
+                raise ValueError("at most {} watched addresses per client".format(self.max_per_client))
+            for address in new:
+                self.watchers.setdefault(address, set()).add(sid)
+            mine |= new
+            if mine:
+                self.watched[sid] = mine
+            return sorted(mine)
+
+    def unwatch(self, sid, addresses=None):
+        """Remove addresses for sid, all of them when addresses is None."""
+        with self.lock:
+            mine = self.watched.get(sid, set())
+            gone = mine if addresses is None else mine & set(addresses)
+            for address in gone:
+                sids = self.watchers.get(address)
+                if sids is not None:
+                    sids.discard(sid)
+                    if not sids:
+                        del self.watchers[address]
+            mine -= gone
+            if not mine:
+                self.watched.pop(sid, None)
+            return sorted(mine)
+
+    def match(self, txs):
+        """{sid: [tx, ...]} for the transactions touching a watched address.
+
+        txs are dicts with 'from' and 'to', as returned by the API.
+        """
+        hits = {}
+        with self.lock:
+            for tx in txs:
+                sids = self.watchers.get(tx['from'], set()) | self.watchers.get(tx['to'], set())
+                for sid in sids:
+                    hits.setdefault(sid, []).append(tx)
+        return hits
+
+    def stats(self):
+        with self.lock:
+            return {'clients': len(self.watched), 'addresses': len(self.watchers)}
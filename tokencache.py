@@ -0,0 +1,81 @@
+"""
+
+Bismuth Explorer Token Cache Module
+
+Version 2.0.2
+
+The issued tokens list, rendered once and kept until index.db changes. A
+change is noticed through PRAGMA data_version and the highest block in
+index.db, and that check runs at most once per block.
+
+"""
+
+import sqlite3
+from threading import Lock
+
+
+class IssuedTokens:
+    """Issue rows of index.db with their rendered table and API records.
+
+    tip is a function giving the current block height, load reads the issue
+    rows, render turns them into the html fragment and record turns one row
+    into its API dict.
+    """
+
+    def __init__(self, index_path, tip, load, render, record):
+        self.index_path = index_path
+        self.tip = tip
+        self.load = load
+        self.render = render
+        self.record = record
+
+        self.conn = None
+        self.checked = None   # block height of the last freshness check
+        self.version = None   # (data_version, max block_height) of index.db
+        self.rows = None
+        self.html = ""
+        self.data = []
+        self.lock = Lock()
+
+    def _version(self):
+        """(data_version, max block_height), or None when index.db cannot be read."""
+        try:
+            if self.conn is None:
+                self.conn = sqlite3.connect('file:{}?mode=ro'.format(self.index_path), uri=True, timeout=1)
+            data_version = self.conn.execute("PRAGMA data_version;").fetchone()[0]
+            if self.version is not None and data_version == self.version[0]:
+                return self.version
+            height = self.conn.execute("SELECT max(block_height) FROM tokens;").fetchone()[0]
+        except sqlite3.Error:
+            if self.conn is not None:
+                self.conn.close()
+            self.conn = None
+            return None
+        return data_version, height
+
+    def refresh(self):
+        """Reload the rows if index.db changed since the last block."""
+        with self.lock:
+            tip = self.tip()
+            if self.rows is not None and tip == self.checked:
+                return
+            self.checked = tip
+
+            version = self._version()
+            if self.rows is not None and version is not None and version == self.version:
+                return
+            self.version = version
+
+            rows = self.load() or []
+            if rows != self.rows:
+                self.rows = rows
+                self.html = self.render(rows)
+                self.data = [self.record(r) for r in rows]
+
+    def fragment(self):
+        self.refresh()
+        return self.html
+
+    def records(self):
+        self.refresh()
+        return self.data
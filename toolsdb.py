@@ -10,10 +10,11 @@ import os
 import time
 import sqlite3
 import logging
-from glob import glob
 from logging.handlers import RotatingFileHandler
 from configparser import ConfigParser
 import toolsp
+import toolssnap
+import blockwatch
 
 # ─────────────────────────────────────────────────────────────────────────────
 # Logging setup
@@ -44,6 +45,17 @@ config = ConfigParser()
 config.read('explorer.ini')
 bis_root = config.get('My Explorer', 'bisroot', fallback='static/ledger.db')
 bis_limit = config.getint('My Explorer', 'bis_limit', fallback=1)
+reorg_window = config.getint('My Explorer', 'reorg_window', fallback=1000)
+snapshot_path = config.get('My Explorer', 'snapshot', fallback='tools.snap')
+snapshot_interval = config.getint('My Explorer', 'snapshot_interval', fallback=60)
+index_root = '{}index.db'.format(toolsp.db_root)
+
+# Token rollups are one UTC day wide
+DAY_SECONDS = 86400
+
+# Miner buckets are one hour wide and kept for the longest leaderboard window
+BUCKET_SECONDS = 3600
+BUCKET_KEEP = max(toolsp.MINER_WINDOWS.values()) + 1
 
 def init_tools_db(db_path='tools.db'):
     """Create a fresh tools.db with the right schema."""
@@ -74,9 +86,168 @@ def init_tools_db(db_path='tools.db'):
             )
             """
         )
+        create_index_tables(conn)
         logger.info("Initialized tools.db with WAL mode")
 
 
+def create_index_tables(conn):
+    """Create the incremental index tables and the builder state tables.
+
+    blockindex holds the hash of each recent block and blockdeltas what each
+    of those blocks changed, so a rollback can be undone block by block.
+    """
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS minerbuckets (
+            address TEXT,
+            bucket  INTEGER,
+            blocks  INTEGER,
+            reward  REAL,
+            PRIMARY KEY (address, bucket)
+        )
+        """
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS minerbuckets_bucket ON minerbuckets(bucket)"
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS toolsinfo (
+            name  TEXT PRIMARY KEY,
+            value TEXT
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS blockindex (
+            block_height INTEGER PRIMARY KEY,
+            block_hash   TEXT
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS blockdeltas (
+            block_height INTEGER,
+            tbl          TEXT,
+            address      TEXT,
+            bucket       INTEGER,
+            blocks       INTEGER,
+            amount       REAL
+        )
+        """
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS blockdeltas_height ON blockdeltas(block_height)"
+    )
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS pending (address TEXT PRIMARY KEY)"
+    )
+    create_token_tables(conn)
+
+
+def create_token_tables(conn):
+    """Create the token tables kept up to date from index.db.
+
+    token_balances holds every non-zero (token, address) balance,
+    token_stats one summary row per token and token_daily the transfers,
+    volume and unique senders and receivers of each token per day.
+    tokenrows keeps the index.db rows of the recent blocks, so a rollback
+    can be spotted and undone block by block.
+    """
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS token_balances (
+            token   TEXT,
+            address TEXT,
+            balance INTEGER,
+            PRIMARY KEY (token, address)
+        )
+        """
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS token_balances_address ON token_balances(address)"
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS token_balances_rank "
+        "ON token_balances(token, balance DESC, address)"
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS token_stats (
+            token          TEXT PRIMARY KEY,
+            issuer         TEXT,
+            supply         INTEGER,
+            holders        INTEGER,
+            transfers      INTEGER,
+            first_block    INTEGER,
+            last_block     INTEGER,
+            last_timestamp REAL
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS token_daily (
+            token     TEXT,
+            day       INTEGER,
+            transfers INTEGER,
+            volume    INTEGER,
+            senders   INTEGER,
+            receivers INTEGER,
+            PRIMARY KEY (token, day)
+        )
+        """
+    )
+    # How often each address sent ('s') and received ('r') a token each day,
+    # for the unique counts
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS token_daily_parties (
+            token   TEXT,
+            day     INTEGER,
+            role    TEXT,
+            address TEXT,
+            n       INTEGER,
+            PRIMARY KEY (token, day, role, address)
+        )
+        """
+    )
+    # Columns other than the height are untyped so values compare exactly
+    # with the ones read back from index.db
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS tokenrows (
+            block_height INTEGER,
+            timestamp,
+            token,
+            address,
+            recipient,
+            txid,
+            amount
+        )
+        """
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS tokenrows_height ON tokenrows(block_height)"
+    )
+
+
+def get_info(conn, name, default=None):
+    """Read a value from the toolsinfo state table."""
+    row = conn.execute("SELECT value FROM toolsinfo WHERE name = ?", (name,)).fetchone()
+    return row[0] if row else default
+
+
+def set_info(conn, name, value):
+    """Write a value to the toolsinfo state table."""
+    conn.execute(
+        "INSERT OR REPLACE INTO toolsinfo(name, value) VALUES (?, ?)",
+        (name, str(value)),
+    )
+
+
 def gather_all_addresses(conn):
     """Get all unique recipients with non-zero amount or reward."""
     rows = conn.execute(
@@ -85,26 +256,422 @@ def gather_all_addresses(conn):
     return [row[0] for row in rows]
 
 
-def gather_delta_addresses(conn, limit):
-    """Get unique recipients and senders from the last `limit` transactions."""
-    cur = conn.execute(
-        "SELECT * FROM transactions ORDER BY timestamp DESC LIMIT ?",
-        (limit,),
+def ledger_height(src_conn):
+    """Highest block in the ledger."""
+    return src_conn.execute("SELECT max(block_height) FROM transactions").fetchone()[0] or 0
+
+
+def record_blocks(conn, src_conn, since, upto):
+    """Store the hashes of blocks since..upto, keeping only the reorg window."""
+    conn.executemany(
+        "INSERT OR REPLACE INTO blockindex(block_height, block_hash) VALUES (?, ?)",
+        src_conn.execute(
+            "SELECT block_height, block_hash FROM transactions "
+            "WHERE block_height > ? AND block_height <= ? GROUP BY block_height",
+            (since, upto),
+        ).fetchall(),
+    )
+    floor = upto - reorg_window
+    conn.execute("DELETE FROM blockindex WHERE block_height <= ?", (floor,))
+    conn.execute("DELETE FROM blockdeltas WHERE block_height <= ?", (floor,))
+
+
+def find_fork(conn, src_conn):
+    """Return the lowest indexed height whose hash no longer matches the ledger.
+
+    Returns None when the index agrees with the ledger and 0 when the
+    rollback goes deeper than the stored window.
+    """
+    stored = conn.execute(
+        "SELECT block_height, block_hash FROM blockindex ORDER BY block_height"
+    ).fetchall()
+    if not stored:
+        return None
+
+    ledger = dict(src_conn.execute(
+        "SELECT block_height, block_hash FROM transactions "
+        "WHERE block_height >= ? GROUP BY block_height",
+        (stored[0][0],),
+    ).fetchall())
+
+    for height, block_hash in stored:
+        if ledger.get(height) != block_hash:
+            if height == stored[0][0]:
+                return 0
+            return height
+    return None
+
+
+def undo_blocks(conn, fork):
+    """Undo every indexed block from fork upwards.
+
+    Additive tables get their stored deltas subtracted. Richlist and minerlist
+    rows are derived from whole-ledger sums, so the addresses those blocks
+    touched are queued for a refresh against the rolled back ledger.
+    """
+    conn.executemany(
+        "UPDATE minerbuckets SET blocks = blocks - ?, reward = reward - ? "
+        "WHERE address = ? AND bucket = ?",
+        conn.execute(
+            "SELECT blocks, amount, address, bucket FROM blockdeltas "
+            "WHERE tbl = 'minerbuckets' AND block_height >= ?",
+            (fork,),
+        ).fetchall(),
+    )
+    conn.execute("DELETE FROM minerbuckets WHERE blocks <= 0")
+    conn.execute(
+        "INSERT OR IGNORE INTO pending(address) SELECT DISTINCT address FROM blockdeltas "
+        "WHERE tbl = 'address' AND block_height >= ?",
+        (fork,),
+    )
+    conn.execute("DELETE FROM blockdeltas WHERE block_height >= ?", (fork,))
+    conn.execute("DELETE FROM blockindex WHERE block_height >= ?", (fork,))
+
+    for name in ('index_height', 'bucket_height'):
+        if int(get_info(conn, name, 0)) >= fork:
+            set_info(conn, name, fork - 1)
+
+
+def record_touched(conn, src_conn, since, upto, queue):
+    """Record the addresses each block since..upto touched and return its rows.
+
+    Rows are (height, timestamp, sender, recipient, reward). Deltas are kept
+    for blocks inside the reorg window; with queue the addresses are also
+    added to `pending` for a refresh.
+    """
+    # Mirror transactions (hypernode payouts, dev rewards) carry negative heights
+    rows = src_conn.execute(
+        "SELECT block_height, timestamp, address, recipient, reward FROM transactions "
+        "WHERE (block_height > ? AND block_height <= ?) OR (block_height < ? AND block_height >= ?)",
+        (since, upto, -since, -upto),
+    ).fetchall()
+
+    touched = set()
+    for height, stamp, sender, recipient, reward in rows:
+        for addr in (sender, recipient):
+            if addr and addr.lower() not in {"hypernode payouts", "development reward"}:
+                touched.add((abs(height), addr))
+
+    if queue:
+        conn.executemany(
+            "INSERT OR IGNORE INTO pending(address) VALUES (?)",
+            {(addr,) for _, addr in touched},
+        )
+    conn.executemany(
+        "INSERT INTO blockdeltas(block_height, tbl, address, bucket, blocks, amount) "
+        "VALUES (?, 'address', ?, NULL, 0, 0)",
+        [(h, addr) for h, addr in touched if h > upto - reorg_window],
+    )
+    return rows
+
+
+def bucket_of(stamp):
+    """Start of the miner bucket holding a timestamp."""
+    return int(float(stamp)) // BUCKET_SECONDS * BUCKET_SECONDS
+
+
+def add_miner_rewards(conn, rows, window_floor):
+    """Add (height, timestamp, miner, reward) rows to the miner buckets.
+
+    Rows above window_floor also get a delta so their block can be undone.
+    """
+    counts = {}
+    deltas = []
+    for height, stamp, miner, reward in rows:
+        key = (miner, bucket_of(stamp))
+        blocks, total = counts.get(key, (0, 0.0))
+        counts[key] = (blocks + 1, total + float(reward))
+        if height > window_floor:
+            deltas.append((height, 'minerbuckets', miner, key[1], 1, float(reward)))
+
+    conn.executemany(
+        "INSERT OR IGNORE INTO minerbuckets(address, bucket, blocks, reward) VALUES (?, ?, 0, 0)",
+        list(counts),
+    )
+    conn.executemany(
+        "UPDATE minerbuckets SET blocks = blocks + ?, reward = reward + ? "
+        "WHERE address = ? AND bucket = ?",
+        [(b, r, addr, bucket) for (addr, bucket), (b, r) in counts.items()],
+    )
+    conn.executemany(
+        "INSERT INTO blockdeltas(block_height, tbl, address, bucket, blocks, amount) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        deltas,
+    )
+    oldest = bucket_of(time.time()) - BUCKET_KEEP * BUCKET_SECONDS
+    conn.execute("DELETE FROM minerbuckets WHERE bucket < ?", (oldest,))
+
+
+def apply_token_rows(conn, rows, sign=1):
+    """Apply (height, timestamp, token, sender, recipient, txid, amount) rows
+    of index.db to the token tables, or take them out again with sign -1.
+    Issues have the sender 'issued'.
+
+    Taking rows out leaves last_block and last_timestamp as they were,
+    undo_token_rows sets them afterwards.
+    """
+    deltas = {}
+    stats = {}
+    daily = {}
+    parties = {}
+    for height, stamp, token, sender, recipient, txid, amount in rows:
+        amount = int(amount) * sign
+        issuer, supply, transfers, first, last, last_stamp = stats.get(
+            token, (None, 0, 0, height, height, stamp))
+        if sender == 'issued':
+            issuer, supply = recipient, supply + amount
+        else:
+            deltas[(token, sender)] = deltas.get((token, sender), 0) - amount
+            transfers += sign
+            day = int(float(stamp)) // DAY_SECONDS * DAY_SECONDS
+            count, volume = daily.get((token, day), (0, 0))
+            daily[(token, day)] = (count + sign, volume + amount)
+            for key in ((token, day, 's', sender), (token, day, 'r', recipient)):
+                parties[key] = parties.get(key, 0) + sign
+        deltas[(token, recipient)] = deltas.get((token, recipient), 0) + amount
+        stats[token] = (issuer, supply, transfers, first, height, stamp)
+
+    conn.executemany(
+        "INSERT OR IGNORE INTO token_balances(token, address, balance) VALUES (?, ?, 0)",
+        list(deltas),
+    )
+    conn.executemany(
+        "UPDATE token_balances SET balance = balance + ? WHERE token = ? AND address = ?",
+        [(d, token, addr) for (token, addr), d in deltas.items()],
+    )
+    conn.executemany(
+        "DELETE FROM token_balances WHERE token = ? AND address = ? AND balance = 0",
+        list(deltas),
     )
-    seen = set()
-    for row in cur:
-        recipient = row[2]
-        if recipient and recipient.lower() not in {"hypernode payouts", "development reward"}:
-            seen.add(recipient)
-        sender = row[3]
-        if sender:
-            seen.add(sender)
-    return list(seen)
 
+    if sign > 0:
+        conn.executemany(
+            "INSERT OR IGNORE INTO token_stats VALUES (?, NULL, 0, 0, 0, ?, ?, ?)",
+            [(token, s[3], s[4], s[5]) for token, s in stats.items()],
+        )
+        conn.executemany(
+            "UPDATE token_stats SET issuer = ifnull(?, issuer), last_block = ?, last_timestamp = ? "
+            "WHERE token = ?",
+            [(s[0], s[4], s[5], token) for token, s in stats.items()],
+        )
+    conn.executemany(
+        "UPDATE token_stats SET supply = supply + ?, transfers = transfers + ?, "
+        "holders = (SELECT count(*) FROM token_balances b WHERE b.token = token_stats.token AND b.balance > 0) "
+        "WHERE token = ?",
+        [(s[1], s[2], token) for token, s in stats.items()],
+    )
 
-def updatedb(do_full, last_block=None, db_path='tools.db'):
-    """Update tools.db fully or incrementally based on last_block."""
-    logger.info("Starting %s update (since=%s)", 'full' if do_full else 'delta', last_block)
+    conn.executemany(
+        "INSERT OR IGNORE INTO token_daily_parties(token, day, role, address, n) VALUES (?, ?, ?, ?, 0)",
+        list(parties),
+    )
+    conn.executemany(
+        "UPDATE token_daily_parties SET n = n + ? WHERE token = ? AND day = ? AND role = ? AND address = ?",
+        [(n,) + key for key, n in parties.items()],
+    )
+    conn.execute("DELETE FROM token_daily_parties WHERE n <= 0")
+    conn.executemany(
+        "INSERT OR IGNORE INTO token_daily VALUES (?, ?, 0, 0, 0, 0)",
+        list(daily),
+    )
+    conn.executemany(
+        "UPDATE token_daily SET transfers = transfers + ?, volume = volume + ?, "
+        "senders = (SELECT count(*) FROM token_daily_parties p "
+        "WHERE p.token = token_daily.token AND p.day = token_daily.day AND p.role = 's'), "
+        "receivers = (SELECT count(*) FROM token_daily_parties p "
+        "WHERE p.token = token_daily.token AND p.day = token_daily.day AND p.role = 'r') "
+        "WHERE token = ? AND day = ?",
+        [(c, v, token, day) for (token, day), (c, v) in daily.items()],
+    )
+    conn.execute("DELETE FROM token_daily WHERE transfers <= 0")
+
+
+TOKEN_COLUMNS = "block_height, timestamp, token, address, recipient, txid, amount"
+TOKEN_TABLES = ('token_balances', 'token_stats', 'token_daily', 'token_daily_parties', 'tokenrows')
+# Bumped when the token tables change shape, they are then rebuilt
+TOKEN_SCHEMA = '2'
+
+
+def token_rows_by_height(rows):
+    heights = {}
+    for row in rows:
+        heights.setdefault(row[0], []).append(tuple(row))
+    return {height: sorted(r) for height, r in heights.items()}
+
+
+def find_token_fork(conn, src_conn, since):
+    """Lowest height within the reorg window whose token rows in index.db
+    no longer match the ones applied, or None."""
+    floor = since - reorg_window
+    stored = token_rows_by_height(conn.execute(
+        "SELECT {} FROM tokenrows WHERE block_height > ?".format(TOKEN_COLUMNS), (floor,)))
+    current = token_rows_by_height(src_conn.execute(
+        "SELECT {} FROM tokens WHERE block_height > ? AND block_height <= ?".format(TOKEN_COLUMNS),
+        (floor, since)))
+    changed = [h for h in set(stored) | set(current) if stored.get(h) != current.get(h)]
+    return min(changed) if changed else None
+
+
+def undo_token_rows(conn, src_conn, fork):
+    """Take the rows of blocks from fork upwards out of the token tables.
+
+    Returns the number of rows undone.
+    """
+    rows = conn.execute(
+        "SELECT {} FROM tokenrows WHERE block_height >= ?".format(TOKEN_COLUMNS), (fork,)
+    ).fetchall()
+    apply_token_rows(conn, rows, sign=-1)
+    conn.execute("DELETE FROM tokenrows WHERE block_height >= ?", (fork,))
+
+    # Last activity of the tokens involved, from the rows index.db still has
+    for token in {r[2] for r in rows}:
+        last = src_conn.execute(
+            "SELECT block_height, timestamp FROM tokens WHERE token = ? AND block_height < ? "
+            "ORDER BY block_height DESC, timestamp DESC LIMIT 1",
+            (token, fork),
+        ).fetchone()
+        if last is None:
+            conn.execute("DELETE FROM token_stats WHERE token = ?", (token,))
+        else:
+            conn.execute(
+                "UPDATE token_stats SET last_block = ?, last_timestamp = ? WHERE token = ?",
+                (last[0], last[1], token),
+            )
+    return len(rows)
+
+
+def sync_tokens(db_path='tools.db'):
+    """Bring the token tables up to the highest block in index.db.
+
+    index.db is written by the node, which drops the rows of rolled back
+    blocks. The rows of the blocks in the reorg window are compared with the
+    ones applied, and the blocks from the first difference are undone. If
+    the number of older rows no longer matches either, the change is deeper
+    than the window and the token tables are rebuilt.
+
+    Returns True when new token rows were applied.
+    """
+    if not os.path.exists(index_root):
+        return False
+
+    with sqlite3.connect(db_path) as conn, \
+            sqlite3.connect('file:{}?mode=ro'.format(index_root), uri=True) as src_conn:
+        create_index_tables(conn)
+        conn.execute("BEGIN")
+
+        since = int(get_info(conn, 'token_height', 0))
+        applied = int(get_info(conn, 'token_rows', 0))
+
+        if get_info(conn, 'token_schema') != TOKEN_SCHEMA:
+            logger.info("Rebuilding token tables for schema %s", TOKEN_SCHEMA)
+            for table in TOKEN_TABLES:
+                conn.execute("DROP TABLE IF EXISTS {}".format(table))
+            create_token_tables(conn)
+            set_info(conn, 'token_schema', TOKEN_SCHEMA)
+            since = applied = 0
+
+        fork = find_token_fork(conn, src_conn, since) if since else None
+        if fork is not None:
+            logger.warning("Token rows changed at block %d, undoing token blocks", fork)
+            applied -= undo_token_rows(conn, src_conn, fork)
+            since = fork - 1
+
+        if since and src_conn.execute(
+            "SELECT count(*) FROM tokens WHERE block_height <= ?", (since,)
+        ).fetchone()[0] != applied:
+            logger.warning("index.db changed below block %d, rebuilding token tables", since)
+            for table in TOKEN_TABLES:
+                conn.execute("DELETE FROM {}".format(table))
+            since = applied = 0
+
+        tip = src_conn.execute("SELECT max(block_height) FROM tokens").fetchone()[0] or 0
+        if tip > since:
+            rows = src_conn.execute(
+                "SELECT {} FROM tokens WHERE block_height > ? AND block_height <= ? "
+                "ORDER BY block_height, timestamp".format(TOKEN_COLUMNS),
+                (since, tip),
+            ).fetchall()
+            apply_token_rows(conn, rows)
+            conn.executemany(
+                "INSERT INTO tokenrows({}) VALUES (?, ?, ?, ?, ?, ?, ?)".format(TOKEN_COLUMNS),
+                [r for r in rows if r[0] > tip - reorg_window],
+            )
+            conn.execute("DELETE FROM tokenrows WHERE block_height <= ?", (tip - reorg_window,))
+            set_info(conn, 'token_height', tip)
+            set_info(conn, 'token_rows', applied + len(rows))
+            logger.info("Token tables synced from block %s to %s, %d rows", since, tip, len(rows))
+
+        conn.commit()
+
+    return tip > since or fork is not None
+
+
+def sync_blocks(db_path='tools.db'):
+    """Bring the incremental indexes up to the ledger tip.
+
+    Checks the stored block hashes first and undoes any rolled back blocks,
+    then applies the new blocks. Addresses touched by new or undone blocks
+    are queued in `pending` for the next updatedb run.
+
+    Returns 'full' if the rollback is deeper than the stored window,
+    'reorg' if blocks were undone, otherwise True/False for new blocks seen.
+    """
+    with sqlite3.connect(db_path) as conn, sqlite3.connect(bis_root) as src_conn:
+        create_index_tables(conn)
+        conn.execute("BEGIN")
+
+        fork = find_fork(conn, src_conn)
+        if fork == 0:
+            logger.warning("Rollback deeper than %d blocks, full rebuild needed", reorg_window)
+            conn.rollback()
+            return 'full'
+        if fork:
+            logger.warning("Ledger rolled back at block %d, undoing indexed blocks", fork)
+            undo_blocks(conn, fork)
+
+        since = int(get_info(conn, 'index_height', 0))
+        tip = ledger_height(src_conn)
+        window_floor = tip - reorg_window
+
+        if tip > since:
+            rows = record_touched(conn, src_conn, since, tip, queue=True)
+
+            if get_info(conn, 'bucket_height') is not None:
+                add_miner_rewards(
+                    conn,
+                    [(h, t, r, w) for h, t, a, r, w in rows if h > 0 and w != 0],
+                    window_floor,
+                )
+                set_info(conn, 'bucket_height', tip)
+
+            record_blocks(conn, src_conn, since, tip)
+            set_info(conn, 'index_height', tip)
+
+        if get_info(conn, 'bucket_height') is None:
+            # First run only needs the longest window, not the whole chain
+            start = int(time.time()) - BUCKET_KEEP * BUCKET_SECONDS
+            add_miner_rewards(
+                conn,
+                src_conn.execute(
+                    "SELECT block_height, timestamp, recipient, reward FROM transactions "
+                    "WHERE timestamp >= ? AND reward != 0 AND block_height > 0 AND block_height <= ?",
+                    (start, tip),
+                ).fetchall(),
+                window_floor,
+            )
+            set_info(conn, 'bucket_height', tip)
+
+        conn.commit()
+
+    if fork:
+        return 'reorg'
+    logger.info("Indexes synced from block %s to %s", since, tip)
+    return tip > since
+
+
+def updatedb(do_full, db_path='tools.db'):
+    """Update tools.db fully or for the addresses queued by sync_blocks."""
+    logger.info("Starting %s update", 'full' if do_full else 'delta')
 
     if do_full:
         init_tools_db(db_path)
@@ -113,14 +680,11 @@ def updatedb(do_full, last_block=None, db_path='tools.db'):
     with sqlite3.connect(bis_root) as src_conn:
         src_conn.row_factory = lambda cursor, row: row
         if do_full:
+            tip = ledger_height(src_conn)
             addresses = gather_all_addresses(src_conn)
         else:
-            latest_block = int(toolsp.latest()[0])
-            block_limit = latest_block - last_block
-            if block_limit <= 0:
-                logger.info("No new blocks since %s", last_block)
-                return False
-            addresses = gather_delta_addresses(src_conn, block_limit)
+            with sqlite3.connect(db_path) as conn:
+                addresses = [row[0] for row in conn.execute("SELECT address FROM pending")]
 
     if not addresses:
         logger.info("No addresses to process.")
@@ -176,42 +740,139 @@ def updatedb(do_full, last_block=None, db_path='tools.db'):
                 miner_rows,
             )
 
+        if do_full:
+            # Start the incremental indexes from the height the full scan saw
+            with sqlite3.connect(bis_root) as src_conn:
+                record_touched(conn, src_conn, tip - reorg_window, tip, queue=False)
+                record_blocks(conn, src_conn, tip - reorg_window, tip)
+            set_info(conn, 'index_height', tip)
+        else:
+            conn.executemany(
+                "DELETE FROM pending WHERE address = ?",
+                ((addr,) for addr in addresses),
+            )
+
         conn.commit()
 
     logger.info("Completed %s update for %d addresses.", 'full' if do_full else 'delta', len(addresses))
     return True
 
 
-def buildtoolsdb():
-    fpath = 'blocks.txt'
+def save_snapshot(db_path='tools.db'):
+    """Write a snapshot of tools.db if every queued address has been refreshed."""
+    with sqlite3.connect(db_path) as conn:
+        if conn.execute("SELECT count(*) FROM pending").fetchone()[0]:
+            logger.info("Addresses still pending, snapshot skipped")
+            return False
+        height = int(get_info(conn, 'index_height', 0))
+        row = conn.execute(
+            "SELECT block_hash FROM blockindex WHERE block_height = ?", (height,)
+        ).fetchone()
+        rich, miners = toolssnap.write_snapshot(conn, snapshot_path, height, row[0] if row else '')
+
+    logger.info("Snapshot at block %d written with %d rich and %d miner rows", height, rich, miners)
+    return True
 
-    # First run: write latest block and do full update
-    if not os.path.exists(fpath):
-        latest = int(toolsp.latest()[0])
-        with open(fpath, 'w') as f:
-            f.write(f"{latest}\n")
-        updatedb(do_full=True)
 
-    # Main loop: incremental updates every 20 minutes
-    while True:
-        # Cleanup QR images
-        for qr in glob('static/qr*.png'):
-            os.remove(qr)
+def restore_snapshot(db_path='tools.db'):
+    """Create tools.db from the snapshot so only the blocks after it need indexing."""
+    try:
+        reader = toolssnap.SnapshotReader(snapshot_path)
+    except (OSError, ValueError):
+        logger.exception("Snapshot %s could not be loaded", snapshot_path)
+        return False
+
+    try:
+        init_tools_db(db_path)
+        with sqlite3.connect(db_path) as conn:
+            conn.execute("BEGIN")
+            toolssnap.restore_tools_db(reader, conn)
+            # The snapshot block hash lets sync_blocks spot a rollback past it
+            conn.execute(
+                "INSERT INTO blockindex(block_height, block_hash) VALUES (?, ?)",
+                (reader.height, reader.block_hash),
+            )
+            set_info(conn, 'index_height', reader.height)
+            conn.commit()
+    finally:
+        reader.close()
+
+    logger.info("tools.db restored from snapshot at block %d", reader.height)
+    return True
+
 
-        # Determine last block threshold
-        with open(fpath) as f:
-            last_blk = int(f.readline().strip()) - 200
+def tools_db_state(db_path='tools.db'):
+    """(built, index height) of tools.db.
 
-        # Write new latest
-        latest = int(toolsp.latest()[0])
-        with open(fpath, 'w') as f:
-            f.write(f"{latest}\n")
+    built is True when the richlist and minerlist tables exist. Any plain
+    sqlite3.connect of a missing tools.db leaves an empty file behind, so a
+    zero-length or schema-less file counts as missing.
+    """
+    if not os.path.exists(db_path) or os.path.getsize(db_path) == 0:
+        return False, None
+    try:
+        with sqlite3.connect('file:{}?mode=ro'.format(db_path), uri=True) as conn:
+            tables = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            since = get_info(conn, 'index_height') if 'toolsinfo' in tables else None
+    except sqlite3.Error:
+        return False, None
+    return {'richlist', 'minerlist'} <= tables, since
 
-        # Run incremental update
-        updatedb(do_full=False, last_block=last_blk)
-        logger.info("Sleeping for 20 minutes before next update.")
-        time.sleep(20 * 60)
 
+def buildtoolsdb():
+    db_path = 'tools.db'
+
+    # A tools.db that was never indexed starts from the snapshot when there is one
+    built, since = tools_db_state(db_path)
+    if since is None and os.path.exists(snapshot_path) and restore_snapshot(db_path):
+        built, since = tools_db_state(db_path)
+
+    # First run: full update. An older tools.db without an index height picks
+    # up from blocks.txt with the old 200 block overlap, once.
+    if built:
+        with sqlite3.connect(db_path) as conn:
+            create_index_tables(conn)
+            since = get_info(conn, 'index_height')
+            if since is None and os.path.exists('blocks.txt'):
+                with open('blocks.txt') as f:
+                    since = max(int(f.readline().strip()) - 200, 0)
+                set_info(conn, 'index_height', since)
+                conn.commit()
+
+    if not built or since is None:
+        updatedb(do_full=True, db_path=db_path)
+
+    # Main loop: index sync on every new block (at least once a minute),
+    # address refresh every 20 minutes or straight away after a rollback
+    watcher = blockwatch.BlockWatcher(bis_root, interval=1)
+    next_refresh = next_snapshot = 0
+    while True:
+        try:
+            synced = sync_blocks(db_path)
+        except Exception:
+            logger.exception("Error syncing indexes")
+            synced = False
+
+        try:
+            sync_tokens(db_path)
+        except Exception:
+            logger.exception("Error syncing token tables")
+
+        now = time.time()
+        if synced == 'full':
+            updatedb(do_full=True, db_path=db_path)
+        elif synced == 'reorg' or now >= next_refresh:
+            updatedb(do_full=False, db_path=db_path)
+            next_refresh = now + 20 * 60
+
+        if snapshot_interval and now >= next_snapshot:
+            try:
+                save_snapshot(db_path)
+            except Exception:
+                logger.exception("Error writing snapshot")
+            next_snapshot = now + snapshot_interval * 60
+
+        watcher.wait(60)
 
 if __name__ == '__main__':
     buildtoolsdb()
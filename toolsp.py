@@ -6,10 +6,10 @@ Version 2.0.1
 
 """
 
-import sqlite3, time, json, requests, re, socks, connections
+import sqlite3, time, json, requests, re, os, socks, connections, toolssnap, renderers, classify
+from html import escape
 
 import configparser as cp
-from bs4 import BeautifulSoup
 
 # Read config
 config = cp.ConfigParser()
@@ -35,8 +35,16 @@ try:
 	port = config.get('My Explorer', 'nodeport')
 except:
 	port = "5658"
+try:
+	snapshot_path = config.get('My Explorer', 'snapshot')
+except:
+	snapshot_path = "tools.snap"
 
 db_hyper = True
+snap_reader = None
+
+# Miner leaderboard windows in hours
+MINER_WINDOWS = {"24h": 24, "7d": 168, "30d": 720}
 
 def get_one_arg(gcom,arg1):
 
@@ -74,6 +82,31 @@ def get_no_arg(gcom):
 
 	return response
 
+class NodeSession:
+	# One node connection reused for a series of commands, reopened after an error
+
+	def __init__(self):
+		self.s = None
+
+	def call(self, gcom, *args):
+		if self.s is None:
+			self.s = socks.socksocket()
+			self.s.settimeout(10)
+			self.s.connect((ip, int(port)))
+		try:
+			connections.send(self.s, gcom, 10)
+			for arg in args:
+				connections.send(self.s, arg)
+			return connections.receive(self.s, 10)
+		except Exception:
+			self.close()
+			raise
+
+	def close(self):
+		if self.s is not None:
+			self.s.close()
+			self.s = None
+
 def getcirc():
 
 	conn = sqlite3.connect(bis_root)
@@ -253,74 +286,119 @@ def get_the_details(getdetail, get_addy):
 
 def test(testString):
 
-	test_result = 3
-
-	if len(testString) == 56:
-		test_result = 1
-
-	if testString.isalnum() == True:
-	
-		try:
-			validate_result = get_one_arg("addvalidate",testString)
-		except:
-			validate_result = ""
-		
-		if validate_result == "valid":
-			test_result = 1
-
+	# 1 address, 2 block height, 3 anything else. Checked locally, no node call
 	if testString.isdigit() == True:
-		test_result = 2
-	
-	#print(test_result)
-	return test_result
+		return 2
+	if classify.is_address(testString):
+		return 1
+	return 3
 	
 def s_test(testString):
 
-	if testString.isalnum() == True:
-
-		try:
-			validate_result = get_one_arg("addvalidate",testString)
-		except:
-			validate_result = ""
-		
-		if validate_result == "valid":
-			return True
-		else:
-			return False
-	else:
-		return False
+	return classify.is_address(testString)
 		
 def d_test(testString):
 
 	if len(testString) == 56:
-		if bool(BeautifulSoup(testString,"html.parser").find()):
+		if renderers.has_markup(testString):
 			return False
 		else:
 			return True
 	else:
 		return False
 
+def snapshot():
+
+	# Memory-mapped tools.db snapshot, reopened when toolsdb writes a new one
+	global snap_reader
+
+	try:
+		mtime = os.path.getmtime(snapshot_path)
+	except OSError:
+		return None
+
+	if snap_reader is None or snap_reader.mtime != mtime:
+		try:
+			new_reader = toolssnap.SnapshotReader(snapshot_path)
+		except (OSError, ValueError):
+			return snap_reader
+		if snap_reader is not None:
+			snap_reader.close()
+		snap_reader = new_reader
+
+	return snap_reader
+
 def miners():
 
-	conn = sqlite3.connect('tools.db')
-	conn.text_factory = str
-	c = conn.cursor()
-	c.execute("SELECT * FROM minerlist ORDER BY blockcount DESC;")
-	miner_result = c.fetchall()
-	c.close()
-	conn.close()
+	try:
+		conn = sqlite3.connect('file:tools.db?mode=ro', uri=True)
+		conn.text_factory = str
+		c = conn.cursor()
+		c.execute("SELECT * FROM minerlist ORDER BY blockcount DESC;")
+		miner_result = c.fetchall()
+		c.close()
+		conn.close()
+	except sqlite3.Error:
+		miner_result = []
+
+	if not miner_result:
+		# tools.db is missing or still building
+		snap = snapshot()
+		if snap:
+			miner_result = snap.minerlist()
 
 	return miner_result
 
+def miner_window(window):
+
+	# The last complete hours only, the bucket of the current hour is still filling
+	until = int(time.time()) // 3600 * 3600
+	since = until - MINER_WINDOWS[window] * 3600
+
+	try:
+		conn = sqlite3.connect('file:tools.db?mode=ro', uri=True)
+		conn.text_factory = str
+		c = conn.cursor()
+		c.execute("SELECT b.address, sum(b.blocks), sum(b.reward), ifnull(m.mname,'') FROM minerbuckets b LEFT JOIN minerlist m ON m.address = b.address WHERE b.bucket >= ? AND b.bucket < ? GROUP BY b.address ORDER BY sum(b.blocks) DESC;",(since,until))
+		w_result = c.fetchall()
+		c.close()
+		conn.close()
+	except sqlite3.Error:
+		w_result = []
+
+	return w_result
+
+def miner_share(window):
+
+	w_result = miner_window(window)
+	w_total = sum(r[1] for r in w_result)
+
+	share_list = []
+
+	for r in w_result:
+		share = 100.0 * r[1] / w_total if w_total else 0.0
+		share_list.append((r[0], r[1], r[2], r[3], share))
+
+	return share_list, w_total
+
 def richones():
 
-	conn = sqlite3.connect('tools.db')
-	conn.text_factory = str
-	c = conn.cursor()
-	c.execute("SELECT * FROM richlist ORDER BY balance DESC;")
-	rich_result = c.fetchall()
-	c.close()
-	conn.close()
+	try:
+		conn = sqlite3.connect('file:tools.db?mode=ro', uri=True)
+		conn.text_factory = str
+		c = conn.cursor()
+		c.execute("SELECT * FROM richlist ORDER BY balance DESC;")
+		rich_result = c.fetchall()
+		c.close()
+		conn.close()
+	except sqlite3.Error:
+		rich_result = []
+
+	if not rich_result:
+		# tools.db is missing or still building
+		snap = snapshot()
+		if snap:
+			rich_result = snap.richlist()
 
 	return rich_result
 	
@@ -448,6 +526,93 @@ def query_token(this_token):
 	return q_tokens
 
 
+def token_summary(this_token):
+
+	# Summary row of token_stats in tools.db, kept up to date by toolsdb
+	try:
+		conn = sqlite3.connect('file:tools.db?mode=ro', uri=True)
+		conn.text_factory = str
+		c = conn.cursor()
+		c.execute("SELECT token, issuer, supply, holders, transfers, first_block, last_block, last_timestamp FROM token_stats WHERE token = ?;", (this_token,))
+		t_stats = c.fetchone()
+		c.close()
+		conn.close()
+	except sqlite3.Error:
+		t_stats = None
+
+	return t_stats
+
+def token_holdings(this_tkaddy):
+
+	# (token, balance) pairs of an address, largest balance first
+	try:
+		conn = sqlite3.connect('file:tools.db?mode=ro', uri=True)
+		conn.text_factory = str
+		c = conn.cursor()
+		c.execute("SELECT token, balance FROM token_balances WHERE address = ? AND balance > 0 ORDER BY balance DESC, token;", (this_tkaddy,))
+		t_holdings = c.fetchall()
+		c.close()
+		conn.close()
+	except sqlite3.Error:
+		t_holdings = []
+
+	return t_holdings
+
+def token_daily(this_token):
+
+	# (day, transfers, volume, senders, receivers) of a token, oldest day first
+	try:
+		conn = sqlite3.connect('file:tools.db?mode=ro', uri=True)
+		conn.text_factory = str
+		c = conn.cursor()
+		c.execute("SELECT day, transfers, volume, senders, receivers FROM token_daily WHERE token = ? ORDER BY day;", (this_token,))
+		t_daily = c.fetchall()
+		c.close()
+		conn.close()
+	except sqlite3.Error:
+		t_daily = []
+
+	return t_daily
+
+def token_holders(this_token, limit, after=None):
+
+	# One page of holders, largest balance first. after is the (balance, address)
+	# of the last holder of the previous page, so each page is a range of the
+	# token_balances_rank index however deep it is.
+	if after:
+		where = "b.token = ? AND b.balance <= ? AND (b.balance < ? OR b.address > ?)"
+		params = (this_token, after[0], after[0], after[1], limit)
+	else:
+		where = "b.token = ?"
+		params = (this_token, limit)
+
+	try:
+		conn = sqlite3.connect('file:tools.db?mode=ro', uri=True)
+		conn.text_factory = str
+		c = conn.cursor()
+		c.execute("SELECT b.address, b.balance, ifnull(r.alias,'') FROM token_balances b LEFT JOIN richlist r ON r.address = b.address WHERE {} AND b.balance > 0 ORDER BY b.balance DESC, b.address LIMIT ?;".format(where), params)
+		t_holders = c.fetchall()
+		c.close()
+		conn.close()
+	except sqlite3.Error:
+		t_holders = []
+
+	return t_holders
+
+def holders_cursor(rank, holder):
+
+	# Cursor after a holder: rank:balance:address
+	return "{}:{}:{}".format(rank, holder[1], holder[0])
+
+def parse_holders_cursor(cursor):
+
+	# (rank, (balance, address)) or None for a missing or bad cursor
+	try:
+		rank, balance, address = cursor.split(":", 2)
+		return int(rank), (int(balance), address)
+	except (AttributeError, ValueError):
+		return None
+
 def refresh(testAddress,typical):
 
 	#bal_all = get_one_arg("balancegetjson",testAddress)
@@ -526,35 +691,23 @@ def refresh(testAddress,typical):
 		
 	return get_stuff
 	
-def mem_html(b):
-
-	send_back = ""
-	
-	if b != "":
-		#print("Realmem: TXs in mempool: " + str(len(b)))
-		for response in b:
-			address = response['address']
-			m_alias = get_alias(address)
-			if m_alias != "":
-				address = m_alias
-			recipient = response['recipient']
-			m_alias = get_alias(recipient)
-			if m_alias != "":
-				recipient = m_alias
-			amount = response['amount']
-			txid = response['signature'][:56]
-			
-			timestamp = str(time.strftime("%H:%M:%S, %d/%m/%Y", time.gmtime(float(response['timestamp']))))
-			send_back = send_back + '<tr><th scope="row"> {} </th>\n'.format(timestamp)
-			send_back = send_back + '<td>{}</td><td>{}</td><td>{}</td><td>{}</td></tr>'.format(address,recipient,amount,txid)
-			
-	else:
-		timestamp = address = recipient = amount = txid = "-"
-		#print("Realmem: No TXs in mempool")
-		send_back = send_back + '<tr><th scope="row"> {} </th>\n'.format(timestamp)
-		send_back = send_back + '<td>{}</td><td>{}</td><td>{}</td><td>{}</td></tr>'.format(address,recipient,amount,txid)
-
-	return send_back
+def mem_row(response):
+	# One mempool transaction as a table row, tagged with its txid for updates
+
+	address = response['address']
+	m_alias = get_alias(address)
+	if m_alias != "":
+		address = m_alias
+	recipient = response['recipient']
+	m_alias = get_alias(recipient)
+	if m_alias != "":
+		recipient = m_alias
+	amount = response['amount']
+	txid = response['signature'][:56]
+
+	timestamp = str(time.strftime("%H:%M:%S, %d/%m/%Y", time.gmtime(float(response['timestamp']))))
+	return '<tr data-txid="{}"><th scope="row"> {} </th>\n<td>{}</td><td>{}</td><td>{}</td><td>{}</td></tr>'.format(
+		escape(txid, quote=True), timestamp, escape(str(address)), escape(str(recipient)), escape(str(amount)), escape(txid))
 	
 def xws(): # list of live wallet servers
 
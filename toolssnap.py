@@ -0,0 +1,211 @@
+"""
+
+Bismuth Explorer Tools Snapshot Module
+
+Version 2.0.2
+
+A snapshot is a single file holding the richlist and minerlist of tools.db
+at a known block. Addresses, aliases and date strings are interned into one
+string table and every column is a fixed-width array, so a reader can
+memory-map the file and use it without parsing.
+
+Layout (little endian, every section 8 byte aligned):
+
+    header    magic, version, height, block hash, row counts, section offsets
+    strings   uint32 offsets[n + 1] followed by the utf-8 blob
+    richlist  uint32 address, float64 balance, uint32 alias
+    minerlist uint32 address, int64 blockcount, float64 treward,
+              uint32 alias, uint32 blatest, uint32 bfirst
+
+blatest and bfirst are the times of a miner's latest and first block as
+toolsp.refresh formats them ("at HH:MM:SS on dd/mm/YYYY"), not heights.
+
+"""
+
+import os
+import sys
+import mmap
+import time
+import struct
+from array import array
+
+MAGIC = b'BISSNAP1'
+VERSION = 1
+
+# magic, version, height, created, block hash, strings, rich rows, miner rows,
+# then the offsets of the string table, the blob and the eleven columns
+HEADER = struct.Struct('<8sIqq64sIII11Q')
+
+RICH_COLUMNS = (('address', 'I'), ('balance', 'd'), ('alias', 'I'))
+MINER_COLUMNS = (
+    ('address', 'I'), ('blockcount', 'q'), ('treward', 'd'),
+    ('alias', 'I'), ('blatest', 'I'), ('bfirst', 'I'),
+)
+
+
+class Interner:
+    """Hands out one id per distinct string."""
+
+    def __init__(self):
+        self.ids = {}
+        self.strings = []
+
+    def __call__(self, value):
+        value = '' if value is None else str(value)
+        i = self.ids.get(value)
+        if i is None:
+            i = self.ids[value] = len(self.strings)
+            self.strings.append(value)
+        return i
+
+
+def _pad(f):
+    """Pad the file to the next 8 byte boundary and return the position."""
+    pos = f.tell()
+    if pos % 8:
+        f.write(b'\0' * (8 - pos % 8))
+    return f.tell()
+
+
+def _write_array(f, typecode, values):
+    a = array(typecode, values)
+    if sys.byteorder != 'little':
+        a.byteswap()
+    offset = _pad(f)
+    a.tofile(f)
+    return offset
+
+
+def write_snapshot(conn, path, height, block_hash):
+    """Write the richlist and minerlist of an open tools.db to path.
+
+    The file is written next to path and renamed over it, so readers never
+    see a partial snapshot.
+    """
+    rich = conn.execute(
+        "SELECT address, balance, alias FROM richlist ORDER BY balance DESC"
+    ).fetchall()
+    miners = conn.execute(
+        "SELECT address, blockcount, treward, mname, blatest, bfirst FROM minerlist "
+        "ORDER BY blockcount DESC"
+    ).fetchall()
+
+    intern = Interner()
+    rich_cols = [
+        [intern(r[0]) for r in rich],
+        [float(r[1]) for r in rich],
+        [intern(r[2]) for r in rich],
+    ]
+    miner_cols = [
+        [intern(m[0]) for m in miners],
+        [int(m[1]) for m in miners],
+        [float(m[2]) for m in miners],
+        [intern(m[3]) for m in miners],
+        [intern(m[4]) for m in miners],
+        [intern(m[5]) for m in miners],
+    ]
+
+    encoded = [s.encode('utf-8') for s in intern.strings]
+    str_offsets = [0]
+    for e in encoded:
+        str_offsets.append(str_offsets[-1] + len(e))
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(b'\0' * HEADER.size)
+        offsets = [_write_array(f, 'I', str_offsets)]
+        offsets.append(_pad(f))
+        f.write(b''.join(encoded))
+        for (_, typecode), values in zip(RICH_COLUMNS + MINER_COLUMNS, rich_cols + miner_cols):
+            offsets.append(_write_array(f, typecode, values))
+        _pad(f)
+
+        f.seek(0)
+        f.write(HEADER.pack(
+            MAGIC, VERSION, int(height), int(time.time()),
+            str(block_hash or '').encode('utf-8')[:64],
+            len(intern.strings), len(rich), len(miners), *offsets
+        ))
+
+    os.replace(tmp_path, path)
+    return len(rich), len(miners)
+
+
+class SnapshotReader:
+    """Memory-mapped view of a snapshot file."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.mtime = os.path.getmtime(path)
+
+        (magic, version, self.height, self.created, block_hash,
+         n_strings, self.n_rich, self.n_miners, *offsets) = HEADER.unpack_from(self._map)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError("{} is not a version {} snapshot".format(path, VERSION))
+        if sys.byteorder != 'little':
+            self.close()
+            raise ValueError("snapshots can only be mapped on little endian hosts")
+        self.block_hash = block_hash.rstrip(b'\0').decode('utf-8')
+
+        view = memoryview(self._map)
+        self._str_offsets = self._column(view, offsets[0], 'I', n_strings + 1)
+        self._blob = view[offsets[1]:offsets[1] + self._str_offsets[n_strings]]
+
+        self.rich = {
+            name: self._column(view, offset, typecode, self.n_rich)
+            for (name, typecode), offset in zip(RICH_COLUMNS, offsets[2:5])
+        }
+        self.miners = {
+            name: self._column(view, offset, typecode, self.n_miners)
+            for (name, typecode), offset in zip(MINER_COLUMNS, offsets[5:])
+        }
+
+    @staticmethod
+    def _column(view, offset, typecode, count):
+        size = struct.calcsize(typecode)
+        return view[offset:offset + size * count].cast(typecode)
+
+    def string(self, i):
+        return bytes(self._blob[self._str_offsets[i]:self._str_offsets[i + 1]]).decode('utf-8')
+
+    def richlist(self):
+        """Rows shaped like the richlist table, highest balance first."""
+        r = self.rich
+        return [
+            (self.string(r['address'][i]), r['balance'][i], self.string(r['alias'][i]))
+            for i in range(self.n_rich)
+        ]
+
+    def minerlist(self):
+        """Rows shaped like the minerlist table, most blocks first."""
+        m = self.miners
+        return [
+            (self.string(m['address'][i]), self.string(m['blatest'][i]),
+             self.string(m['bfirst'][i]), m['blockcount'][i], m['treward'][i],
+             self.string(m['alias'][i]))
+            for i in range(self.n_miners)
+        ]
+
+    def close(self):
+        for name in ('rich', 'miners'):
+            for column in getattr(self, name, {}).values():
+                column.release()
+        for name in ('_str_offsets', '_blob'):
+            if hasattr(self, name):
+                getattr(self, name).release()
+        self._map.close()
+
+
+def restore_tools_db(reader, conn):
+    """Fill the richlist and minerlist tables of a new tools.db from a snapshot."""
+    conn.executemany(
+        "INSERT OR IGNORE INTO richlist(address,balance,alias) VALUES (?,?,?)",
+        reader.richlist(),
+    )
+    conn.executemany(
+        "INSERT OR IGNORE INTO minerlist VALUES (?,?,?,?,?,?)",
+        reader.minerlist(),
+    )
@@ -0,0 +1,68 @@
+"""
+
+Bismuth Explorer Transaction Feed Module
+
+Version 2.0.2
+
+"""
+
+from collections import deque
+from threading import Lock
+
+
+class TxFeed:
+    """Latest transactions of the home page kept as rendered rows, newest first.
+
+    update() is given the latest transactions from the node and renders only
+    the ones it has not seen. It returns what changed, so the caller can send
+    clients the new rows and the number of rows to drop from the bottom
+    instead of the whole table.
+    """
+
+    def __init__(self, render, size=50):
+        self.render = render
+        self.size = size
+        self.rows = deque()
+        self.lock = Lock()
+
+    @staticmethod
+    def key(tx):
+        return (tx[0], str(tx[5])[:56])
+
+    def html(self):
+        with self.lock:
+            return ''.join(h for _, h in self.rows)
+
+    def update(self, txs):
+        """Merge the latest transactions, newest first.
+
+        Returns None when nothing changed, {'rows': html, 'trim': n} when
+        new rows were added on top, or {'reset': html} when the table has
+        to be replaced, on the first fill or after a rollback.
+        """
+        txs = list(txs)[:self.size]
+        fresh = [self.key(tx) for tx in txs]
+
+        with self.lock:
+            known = dict(self.rows)
+            old = [k for k, _ in self.rows]
+
+            n_new = 0
+            while n_new < len(fresh) and fresh[n_new] not in known:
+                n_new += 1
+
+            if not old or fresh[n_new:] != old[:len(fresh) - n_new]:
+                # Rows we have are gone or reordered, rebuild reusing rendered rows
+                self.rows = deque((k, known.get(k) or self.render(tx)) for k, tx in zip(fresh, txs))
+                return {'reset': ''.join(h for _, h in self.rows)}
+
+            if n_new == 0:
+                return None
+
+            new = [(k, self.render(tx)) for k, tx in zip(fresh[:n_new], txs[:n_new])]
+            self.rows.extendleft(reversed(new))
+            trim = max(0, len(self.rows) - self.size)
+            for _ in range(trim):
+                self.rows.pop()
+
+        return {'rows': ''.join(h for _, h in new), 'trim': trim}